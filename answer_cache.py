@@ -0,0 +1,132 @@
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIMILARITY
+from performance_monitor import performance_monitor
+
+CachedAnswer = namedtuple("CachedAnswer", ["answer", "model_name", "chunk_ids", "query_embedding", "created_at"])
+
+
+def normalize_query(query):
+    """Lowercased words of the query, so case, spacing and punctuation do not change the key."""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+# Words that point back at earlier turns ("and the second one?", "what about it?")
+FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "his", "her",
+    "one", "ones", "first", "second", "third", "last", "previous", "above", "same", "other", "else", "more",
+}
+FOLLOW_UP_OPENERS = ("and", "also", "what about", "how about", "why", "then")
+
+
+def depends_on_context(query):
+    """True for questions that only make sense after earlier turns, whose answers must not be shared."""
+    normalized = normalize_query(query)
+    if normalized.startswith(FOLLOW_UP_OPENERS) and len(normalized.split()) <= 6:
+        return True
+    return any(word in FOLLOW_UP_WORDS for word in normalized.split())
+
+
+def unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Process-wide cache of chat answers per session index version.
+    A question is looked up by its normalized text, then by the most similar cached question of
+    the same session and index version (query embedding cosine >= `similarity`). A match is only
+    served when the current retrieval returned the same chunk ids the cached answer was built from.
+    Entries expire after `ttl_s` and the least recently used are evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_s=ANSWER_CACHE_TTL_S, similarity=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (session_id, index_version, normalized query) -> CachedAnswer, oldest first
+
+    def lookup(self, session_id, index_version, query, query_embedding, chunk_ids):
+        """Return (CachedAnswer, "hit" or "near_hit") for a question, or (None, "miss")."""
+        key = (session_id, index_version, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            match_type = "hit"
+            entry = self._entries.get(key)
+            if entry is None:
+                match_type = "near_hit"
+                key, entry = self._most_similar((session_id, index_version), unit_vector(query_embedding))
+            if entry is not None and entry.chunk_ids != frozenset(chunk_ids):
+                performance_monitor.increment("answer_cache_stale")
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            performance_monitor.increment("answer_cache_misses")
+            return None, "miss"
+        performance_monitor.increment(f"answer_cache_{match_type}s")
+        return entry, match_type
+
+    def _most_similar(self, scope, query_vector):
+        best_key, best_entry, best_similarity = None, None, self.similarity
+        for key, entry in self._entries.items():
+            if key[:2] != scope:
+                continue
+            similarity = float(np.dot(entry.query_embedding, query_vector))
+            if similarity >= best_similarity:
+                best_key, best_entry, best_similarity = key, entry, similarity
+        return best_key, best_entry
+
+    def store(self, session_id, index_version, query, query_embedding, chunk_ids, answer, model_name):
+        key = (session_id, index_version, normalize_query(query))
+        entry = CachedAnswer(answer, model_name, frozenset(chunk_ids), unit_vector(query_embedding), time.time())
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            performance_monitor.increment("answer_cache_evictions", evicted)
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl_s]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            performance_monitor.increment("answer_cache_expirations", len(expired))
+
+    def invalidate(self, session_id):
+        """Drop a session's answers after its index changed or it was reset."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == session_id]:
+                del self._entries[key]
+
+    def stats(self):
+        counters = performance_monitor.counters
+        hits = counters.get("answer_cache_hits", 0) + counters.get("answer_cache_near_hits", 0)
+        lookups = hits + counters.get("answer_cache_misses", 0)
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "max_entries": self.max_entries, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
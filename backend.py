@@ -3,22 +3,29 @@ import streamlit as st
 import requests as requests
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime
+from collections import Counter
 from dotenv import load_dotenv
 from uuid import uuid4
 import base64
+import json
 import os
 
 from config import GOOGLE_API_KEY
 from history import save_history, get_history, clear_history
-from pdf_utils import extract_text_from_pdfs
-from vectorstore_utils import chunk_text, create_vector_store, load_vector_store
+from pdf_utils import extract_text_from_pdfs, safe_filename
+from vectorstore_utils import chunk_text, add_documents_to_vector_store, load_vector_store, session_write_lock
+from vector_store_registry import get_vector_store_registry
+from answer_cache import get_answer_cache
 from llm_utils import get_chain 
-from performance_monitor import PerformanceMonitor
-from langgraph_workflow import run_chat_workflow_async, ChatState
+from performance_monitor import performance_monitor
+from langgraph_workflow import run_chat_workflow_async, stream_chat_workflow, ChatState
 
-from ocr_txt_search_utils import answer_from_txt_files
+from ocr_txt_search_utils import answer_from_txt_files, get_text_index, close_text_index
+from ingest_jobs import IngestJobScheduler, InMemoryUploadFile
+from ocr_utils import OcrBudget, estimated_ocr_time_saved_ms
+from embedding_engine import embedding_chunks_per_s
 
 
 import logging
@@ -27,9 +34,6 @@ import logging
 # Setup for logging
 logging.basicConfig(level=logging.INFO)
 
-performance_monitor = PerformanceMonitor()
-
-
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -39,14 +43,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ingest_scheduler = IngestJobScheduler()
+
+
+def submit_ingest_job(session_id, files):
+    """Queue a background ingest and answer with the job id straight away."""
+    try:
+        job = ingest_scheduler.submit(session_id, files)
+    except RuntimeError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "session_id": session_id,
+        "status": job.status
+    })
+
 
 @app.post("/upload_pdfs/")
 @performance_monitor.timing_decorator("upload_pdfs_endpoint")
-async def upload_pdfs(files: list[UploadFile] = File(...), session_id: str = Form(None)):
+async def upload_pdfs(files: list[UploadFile] = File(...), session_id: str = Form(None), async_job: bool = Form(False)):
     if not session_id or session_id == "string":
         session_id = str(uuid4())
+    if async_job:
+        # The request's files are closed once we respond, so read them now
+        in_memory_files = [InMemoryUploadFile(f.filename, await f.read()) for f in files]
+        return submit_ingest_job(session_id, in_memory_files)
     start_time = time.time()
-    ocr_text, _, pdf_names, ocr_chunks, ocr_metadatas = await extract_text_from_pdfs(files, session_id=session_id)
+    ocr_stats, ocr_budget = Counter(), OcrBudget()
+    try:
+        ocr_text, _, pdf_names, ocr_chunks, ocr_metadatas = await extract_text_from_pdfs(
+            files, session_id=session_id, stats=ocr_stats, budget=ocr_budget
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     pdf_processing_time = (time.time() - start_time) * 1000
     performance_monitor.metrics["pdf_processing"].append(pdf_processing_time)
     print(f"[PERFORMANCE] PDF Processing: {pdf_processing_time:.2f}ms")
@@ -54,7 +83,7 @@ async def upload_pdfs(files: list[UploadFile] = File(...), session_id: str = For
         return JSONResponse(status_code=400, content={"error": "No text extracted from PDFs."})
     # Time vector store creation
     start_time = time.time()
-    create_vector_store(ocr_chunks, session_id, ocr_metadatas)
+    chunks_added = await add_documents_to_vector_store(ocr_chunks, session_id, ocr_metadatas, stats=ocr_stats)
     vector_store_time = (time.time() - start_time) * 1000
     performance_monitor.metrics["vector_store_creation"].append(vector_store_time)
     print(f"[PERFORMANCE] Vector Store Creation: {vector_store_time:.2f}ms")
@@ -62,10 +91,16 @@ async def upload_pdfs(files: list[UploadFile] = File(...), session_id: str = For
         "session_id": session_id, 
         "pdf_names": pdf_names, 
         "chunks": len(ocr_chunks),
+        "chunks_added": chunks_added,
         'OCR': ocr_text,
         "performance_metrics": {
             "pdf_processing_ms": pdf_processing_time,
-            "vector_store_creation_ms": vector_store_time
+            "vector_store_creation_ms": vector_store_time,
+            "images_skipped": ocr_stats["images_skipped"],
+            "embeddings_cached": ocr_stats["embeddings_cached"],
+            "embedding_chunks_per_s": embedding_chunks_per_s(ocr_stats),
+            "ocr_time_saved_ms": estimated_ocr_time_saved_ms(ocr_stats),
+            **ocr_budget.to_dict()
         }
     }
 
@@ -73,13 +108,24 @@ async def upload_pdfs(files: list[UploadFile] = File(...), session_id: str = For
 async def upload_pdfs_base64(
     files_base64: list[str] = Body(...),
     filenames: list[str] = Body(...),
-    session_id: str = Form(None)
+    session_id: str = Form(None),
+    async_job: bool = Body(False)
 ):
     if not session_id or session_id == "string":
         session_id = str(uuid4())
+    if async_job:
+        try:
+            in_memory_files = [
+                InMemoryUploadFile(fname, base64.b64decode(b64))
+                for b64, fname in zip(files_base64, filenames)
+            ]
+        except Exception as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return submit_ingest_job(session_id, in_memory_files)
     temp_files = []
     try:
         for b64, fname in zip(files_base64, filenames):
+            fname = safe_filename(fname)
             pdf_bytes = base64.b64decode(b64)
             temp_path = f"pdf_output/{session_id or 'default'}/{fname}"
             os.makedirs(os.path.dirname(temp_path), exist_ok=True)
@@ -94,7 +140,10 @@ async def upload_pdfs_base64(
                     return self.file.read()
             temp_files.append(DummyUploadFile(temp_path, fname))
         start_time = time.time()
-        ocr_text, _, pdf_names, ocr_chunks, ocr_metadatas = await extract_text_from_pdfs(temp_files, session_id=session_id)
+        ocr_stats, ocr_budget = Counter(), OcrBudget()
+        ocr_text, _, pdf_names, ocr_chunks, ocr_metadatas = await extract_text_from_pdfs(
+            temp_files, session_id=session_id, stats=ocr_stats, budget=ocr_budget
+        )
         pdf_processing_time = (time.time() - start_time) * 1000
         performance_monitor.metrics["pdf_processing"].append(pdf_processing_time)
         print(f"[PERFORMANCE] PDF Processing: {pdf_processing_time:.2f}ms")
@@ -103,7 +152,7 @@ async def upload_pdfs_base64(
         if not ocr_chunks:
             return JSONResponse(status_code=400, content={"error": "No text extracted from PDFs."})
         start_time = time.time()
-        create_vector_store(ocr_chunks, session_id, ocr_metadatas)
+        chunks_added = await add_documents_to_vector_store(ocr_chunks, session_id, ocr_metadatas, stats=ocr_stats)
         vector_store_time = (time.time() - start_time) * 1000
         performance_monitor.metrics["vector_store_creation"].append(vector_store_time)
         print(f"[PERFORMANCE] Vector Store Creation: {vector_store_time:.2f}ms")
@@ -111,15 +160,29 @@ async def upload_pdfs_base64(
             "session_id": session_id,
             "pdf_names": pdf_names,
             "chunks": len(ocr_chunks),
+            "chunks_added": chunks_added,
             'OCR': ocr_text,
             "performance_metrics": {
                 "pdf_processing_ms": pdf_processing_time,
-                "vector_store_creation_ms": vector_store_time
+                "vector_store_creation_ms": vector_store_time,
+                "images_skipped": ocr_stats["images_skipped"],
+                "embeddings_cached": ocr_stats["embeddings_cached"],
+                "embedding_chunks_per_s": embedding_chunks_per_s(ocr_stats),
+                "ocr_time_saved_ms": estimated_ocr_time_saved_ms(ocr_stats),
+                **ocr_budget.to_dict()
             }
         }
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Status, per-stage timings and progress counters of a background upload"""
+    job = ingest_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"No ingest job found: {job_id}"})
+    return job.to_dict()
+
 @app.post("/chat/")
 @performance_monitor.timing_decorator("chat_endpoint")
 async def chat(query: str = Form(...), session_id: str = Form(...)):
@@ -142,20 +205,10 @@ async def chat(query: str = Form(...), session_id: str = Form(...)):
         
         # Extract results and metadata
         answer = result.get("answer", "No answer could be generated.")
-        print(f"[DEBUG] Generated answer: {answer}")
         timestamp = result.get("timestamp", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         
         # --- Extract bounding boxes from docs metadata ---
-        docs = result.get("docs", [])
-        bboxes = []
-        for doc in docs:
-            source_val = doc.metadata.get('source')
-            bbox_val = doc.metadata.get('bbox')
-            if source_val and bbox_val:
-                bboxes.append({
-                    "source": source_val,
-                    "bbox": bbox_val
-                })
+        bboxes = docs_bboxes(result.get("docs", []))
 
         # --- Add sources to the answer ---
         # sources = []
@@ -182,26 +235,115 @@ async def chat(query: str = Form(...), session_id: str = Form(...)):
         logging.error(f"Error during chat: {e}")
         return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {str(e)}"})
 
+def docs_bboxes(docs):
+    """Source file and bbox of each retrieved chunk that has them, for highlighting"""
+    bboxes = []
+    for doc in docs:
+        source_val = doc.metadata.get('source')
+        bbox_val = doc.metadata.get('bbox')
+        if source_val and bbox_val:
+            bboxes.append({
+                "source": source_val,
+                "bbox": bbox_val
+            })
+    return bboxes
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(query: str = Form(...), session_id: str = Form(...)):
+    """
+    Server-sent events version of /chat/. Events: "sources" (retrieved chunks and bboxes) once the
+    search is done, "token" for each piece of the answer as Gemini generates it, "restart" when the
+    answer is replaced by a web search, then "done" with the final answer, bboxes and performance.
+    """
+    if not session_id:
+        return JSONResponse(status_code=400, content={"error": "session_id is required."})
+    start_time = time.time()
+    conversation_history = get_history(session_id)
+    state: ChatState = {
+        "query": query,
+        "session_id": session_id,
+        "answer": "",
+        "performance": {},
+        "messages": conversation_history.messages if hasattr(conversation_history, 'messages') else conversation_history
+    }
+
+    async def events():
+        first_token_time = None
+        bboxes = []
+        try:
+            async for event, data in stream_chat_workflow(state):
+                if event == "docs":
+                    bboxes = docs_bboxes(data)
+                    sources = list(dict.fromkeys(doc.metadata.get("source") for doc in data if doc.metadata.get("source")))
+                    yield sse_event("sources", {"sources": sources, "bboxes": bboxes})
+                elif event == "token":
+                    if first_token_time is None:
+                        first_token_time = (time.time() - start_time) * 1000
+                        performance_monitor.metrics["time_to_first_token"].append(first_token_time)
+                        print(f"[PERFORMANCE] Time to first token: {first_token_time:.2f}ms")
+                    yield sse_event("token", {"text": data})
+                elif event == "restart":
+                    yield sse_event("restart", {"node": data})
+                else:
+                    yield sse_event("done", {
+                        "answer": data.get("answer", "No answer could be generated."),
+                        "session_id": session_id,
+                        "bboxes": bboxes,
+                        "timestamp": data.get("timestamp", datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                        "performance": {**data.get("performance", {}), "time_to_first_token_ms": first_token_time,
+                                        "total_ms": (time.time() - start_time) * 1000}
+                    })
+        except Exception as e:
+            logging.error(f"Error during streamed chat: {e}")
+            yield sse_event("error", {"error": f"An unexpected error occurred: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/reset/")
 async def reset_session(session_id: str = Form(...)):
-    clear_history(session_id)
-    # Optionally, remove FAISS index for session
-    import shutil
-    try:
-        shutil.rmtree(f"faiss_index/{session_id}")
-    except Exception:
-        pass
-    return {"status": "reset", "session_id": session_id}
+    # Stop the session's background uploads first, or they would write the index back after it is deleted
+    cancelled_jobs = await ingest_scheduler.cancel_session(session_id)
+    async with session_write_lock(session_id):
+        clear_history(session_id)
+        # Optionally, remove FAISS index for session
+        import shutil
+        try:
+            shutil.rmtree(f"faiss_index/{session_id}")
+        except Exception:
+            pass
+        # Drop the session's text index and page artifacts so /search_text/ no longer finds them
+        close_text_index(f"pdf_output/{session_id}", delete=True)
+        shutil.rmtree(f"pdf_output/{session_id}", ignore_errors=True)
+        get_vector_store_registry().invalidate(session_id)
+        get_answer_cache().invalidate(session_id)
+    return {"status": "reset", "session_id": session_id, "cancelled_jobs": cancelled_jobs}
 
 @app.get("/history/")
 async def history(session_id: str):
     history = get_history(session_id)
     return {"session_id": session_id, "history": history}
 
+@app.get("/search_text/")
+async def search_text(session_id: str, query: str, limit: int = 20):
+    """Exact-text lookup in the session's OCR and PDF text: matching lines with their file and bbox, no LLM call"""
+    output_dir = f"pdf_output/{session_id}"
+    if not os.path.isdir(output_dir):
+        return JSONResponse(status_code=404, content={"error": f"No documents found for session: {session_id}"})
+    start_time = time.time()
+    matches = get_text_index(output_dir).search(query, limit)
+    search_time = (time.time() - start_time) * 1000
+    performance_monitor.metrics.setdefault("text_search", []).append(search_time)
+    print(f"[PERFORMANCE] Text Search: {search_time:.2f}ms")
+    return {"session_id": session_id, "query": query, "matches": matches, "search_ms": search_time}
+
 @app.get("/performance_metrics/")
 async def get_performance_metrics():
     """Get aggregated performance metrics"""
-    return performance_monitor.get_metrics_summary()
+    return {**performance_monitor.get_metrics_summary(), "vector_store_registry": get_vector_store_registry().stats(),
+            "answer_cache": get_answer_cache().stats()}
 
 @app.get("/performance_metrics/save/")
 async def save_performance_metrics():
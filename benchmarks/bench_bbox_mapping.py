@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for pdf_utils.map_chunks_to_bboxes on a synthetic 5,000-word page.
+Compares the vectorized mapping with the previous row-by-row pandas loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_bbox_mapping
+"""
+import random
+import string
+import time
+
+import pandas as pd
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from pdf_utils import map_chunks_to_bboxes
+
+N_WORDS = 5000
+REPEATS = 5
+
+
+def synthetic_page(n_words, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_words):
+        word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        rows.append({
+            "text": word,
+            "left": (i % 12) * 80 + rng.randint(0, 5),
+            "top": (i // 12) * 20 + rng.randint(0, 3),
+            "width": len(word) * 7,
+            "height": 14,
+        })
+    return pd.DataFrame(rows)
+
+
+def legacy_map_chunks_to_bboxes(sorted_df, chunks):
+    """The original per-row implementation, kept here for comparison."""
+    chunk_bboxes = []
+    word_idx = 0
+    for chunk in chunks:
+        chunk_words = []
+        chunk_text_covered = ""
+        while word_idx < len(sorted_df) and len(chunk_text_covered) < len(chunk):
+            word_data = sorted_df.iloc[word_idx]
+            chunk_words.append(word_data)
+            chunk_text_covered += word_data['text'] + ' '
+            word_idx += 1
+        if not chunk_words:
+            continue
+        x_min = min(int(w['left']) for w in chunk_words)
+        y_min = min(int(w['top']) for w in chunk_words)
+        x_max = max(int(w['left'] + w['width']) for w in chunk_words)
+        y_max = max(int(w['top'] + w['height']) for w in chunk_words)
+        chunk_bboxes.append((chunk, [x_min, y_min, x_max, y_max]))
+    return chunk_bboxes
+
+
+def best_of(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    page_df = synthetic_page(N_WORDS)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=200)
+    chunks = text_splitter.split_text(' '.join(page_df['text']))
+
+    legacy_ms = best_of(legacy_map_chunks_to_bboxes, page_df, chunks)
+    vectorized_ms = best_of(map_chunks_to_bboxes, page_df, chunks)
+    print(f"words={N_WORDS} chunks={len(chunks)}")
+    print(f"legacy loop:     {legacy_ms:8.2f}ms")
+    print(f"vectorized:      {vectorized_ms:8.2f}ms")
+    print(f"speedup:         {legacy_ms / vectorized_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark concurrent chats through the LangGraph workflow with a stand-in LLM of fixed latency.
+N chats are started at once against a session index built with the local embedding provider.
+"blocking" answers from the event loop the way model.predict did, so chats queue behind each
+other (~N x latency); "async" awaits the model, so all N should finish in about one latency.
+The largest gap between 10ms event-loop ticks shows how long other requests would have stalled.
+
+Run from the repository root:
+    python -m benchmarks.bench_chat_concurrency [n_chats] [llm_latency_s]
+"""
+import os
+
+os.environ["EMBEDDING_PROVIDER"] = "local"
+os.environ["ANSWER_CACHE_ENABLED"] = "false"  # every run must reach the LLM
+os.environ["CONTEXT_RECENT_TURNS"] = "1000"  # no conversation summaries through Gemini
+
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import langgraph_workflow
+from llm_utils import QAChain
+from vectorstore_utils import add_documents_to_vector_store
+
+
+class StandInChatModel(BaseChatModel):
+    """Chat model answering after `latency` seconds; `blocking` also sleeps the event loop on ainvoke."""
+
+    latency: float = 1.0
+    blocking: bool = False
+
+    @property
+    def _llm_type(self):
+        return "stand-in"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="The pump needs new seals."))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.blocking:
+            return self._generate(messages)
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="The pump needs new seals."))])
+
+
+async def run_chats(n_chats):
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        langgraph_workflow.run_chat_workflow_async({
+            "query": f"What does pump {i} need?", "session_id": "bench", "answer": "", "performance": {}, "messages": []
+        })
+        for i in range(n_chats)
+    ))
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+    max_stall = max((b - a for a, b in zip(ticks, ticks[1:])), default=0.0)
+    return elapsed, max_stall
+
+
+def main():
+    n_chats = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    work_dir = tempfile.mkdtemp()
+    os.chdir(work_dir)
+    try:
+        chunks = [f"Pump {i} maintenance: replace the seals every {100 + i} hours." for i in range(200)]
+        asyncio.run(add_documents_to_vector_store(chunks, "bench"))
+        print(f"chats={n_chats} stand-in LLM latency={latency:.2f}s")
+        for mode in ("blocking", "async"):
+            model = StandInChatModel(latency=latency, blocking=mode == "blocking")
+            langgraph_workflow.get_chain = lambda context_type="local": QAChain(model, "{context}\n{question}")
+            elapsed, max_stall = asyncio.run(run_chats(n_chats))
+            print(f"{mode:<9} {elapsed:6.2f}s for all chats ({elapsed / latency:5.2f} x LLM latency), "
+                  f"longest event-loop stall {max_stall * 1000:7.1f}ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark the EmbeddingEngine against a local stand-in embedding server.
+The server answers POST /embed {"texts": [...]} after a fixed latency plus a per-text cost,
+and returns 429 when more than `rate_limit` requests arrive within one second, like a
+quota-limited embedding API. The baseline embeds fixed batches of 100 one request at a
+time, as create_vector_store used to, waiting a second whenever it is rate limited.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_engine [n_chunks] [rate_limit_per_s]
+"""
+import asyncio
+import hashlib
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_engine import EmbeddingEngine
+
+DIM = 64
+BASE_LATENCY_S = 0.3
+PER_TEXT_S = 0.003
+
+
+def fake_vector(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [b / 255 for b in (digest * (DIM // len(digest) + 1))[:DIM]]
+
+
+def make_handler(rate_limit):
+    recent = deque()
+    lock = threading.Lock()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["texts"]
+            with lock:
+                now = time.monotonic()
+                while recent and now - recent[0] > 1.0:
+                    recent.popleft()
+                limited = len(recent) >= rate_limit
+                if not limited:
+                    recent.append(now)
+            if limited:
+                self.send_response(429)
+                self.end_headers()
+                self.wfile.write(b'{"error": "RESOURCE_EXHAUSTED: quota exceeded"}')
+                return
+            time.sleep(BASE_LATENCY_S + PER_TEXT_S * len(texts))
+            body = json.dumps({"embeddings": [fake_vector(text) for text in texts]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StandInHandler
+
+
+class StandInEmbeddings(Embeddings):
+    """LangChain embeddings client for the stand-in server; 429s surface as urllib HTTPError."""
+
+    def __init__(self, url):
+        self.url = url
+        self.requests = 0
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        request = urllib.request.Request(self.url, data=json.dumps({"texts": texts}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["embeddings"]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def main():
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rate_limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(rate_limit))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/embed"
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * (5 + i % 40) for i in range(n_chunks)]
+
+    client = StandInEmbeddings(url)
+    start = time.perf_counter()
+    for i in range(0, n_chunks, 100):
+        while True:
+            try:
+                client.embed_documents(texts[i:i + 100])
+                break
+            except urllib.error.HTTPError:
+                time.sleep(1.0)
+    sequential_s = time.perf_counter() - start
+    time.sleep(1.0)  # let the server's rate window drain
+
+    client = StandInEmbeddings(url)
+    engine = EmbeddingEngine(client, max_concurrency=8, backoff_base_s=0.5)
+    start = time.perf_counter()
+    vectors = asyncio.run(engine.embed(texts))
+    engine_s = time.perf_counter() - start
+    server.shutdown()
+
+    assert vectors == [fake_vector(text) for text in texts]
+    print(f"chunks={n_chunks} server rate limit={rate_limit} req/s")
+    print(f"sequential batches of 100: {sequential_s:7.2f}s ({n_chunks / sequential_s:8.1f} chunks/s)")
+    print(f"embedding engine:          {engine_s:7.2f}s ({n_chunks / engine_s:8.1f} chunks/s, "
+          f"{client.requests} requests, final concurrency {engine.limit})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark loading a saved session index: LangChain's pickle format (FAISS.load_local) against
+the memory-mapped index plus SQLite docstore written by save_vector_store.
+Each load runs in a fresh process, which reports the load time, the growth of its resident
+memory (Linux /proc) and the time of one k=4 search including fetching the hits' texts.
+A flat index is scanned in full, so its mapped pages become resident on the first search;
+those pages are shared page cache rather than a private copy per process.
+
+Run from the repository root:
+    python -m benchmarks.bench_index_loading [n_chunks ...]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from embedding_providers import HashingEmbeddings
+from sqlite_docstore import load_docstore, write_docstore
+
+DIM = 384
+CHUNK_CHARS = 2000
+
+
+def build(n_chunks, pickle_dir, sqlite_dir):
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(DIM)
+    index.add(rng.normal(size=(n_chunks, DIM)).astype(np.float32))
+    docs = {
+        f"id{i}": Document(id=f"id{i}", page_content=f"chunk {i} " + "x" * CHUNK_CHARS,
+                           metadata={"source": f"doc{i % 50}.pdf", "bbox": [1.0, 2.0, 3.0, 4.0],
+                                     "page_width": 612, "page_height": 792})
+        for i in range(n_chunks)
+    }
+    ids = {i: f"id{i}" for i in range(n_chunks)}
+    FAISS(HashingEmbeddings(DIM), index, InMemoryDocstore(docs), ids).save_local(pickle_dir)
+    faiss.write_index(index, os.path.join(sqlite_dir, "index.faiss"))
+    write_docstore(sqlite_dir, InMemoryDocstore(docs), ids)
+
+
+def rss_mb():
+    """Resident memory of this process (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def measure(fmt, path, results):
+    embeddings = HashingEmbeddings(DIM)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    if fmt == "pickle":
+        store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    else:
+        index = faiss.read_index(os.path.join(path, "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        store = FAISS(embeddings, index, *load_docstore(path))
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb() - rss_before
+    start = time.perf_counter()
+    store.similarity_search("chunk 42", k=4)
+    search_s = time.perf_counter() - start
+    results.put((load_s, rss_loaded, search_s, rss_mb() - rss_before))
+
+
+def run(fmt, path):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=measure, args=(fmt, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000]
+    print(f"dim={DIM} chunk={CHUNK_CHARS} chars, flat index, fresh process per load")
+    for n_chunks in sizes:
+        with tempfile.TemporaryDirectory() as pickle_dir, tempfile.TemporaryDirectory() as sqlite_dir:
+            build(n_chunks, pickle_dir, sqlite_dir)
+            for fmt, path in (("pickle", pickle_dir), ("mmap+sqlite", sqlite_dir)):
+                load_s, rss_loaded, search_s, rss_searched = run(fmt, path)
+                print(f"{n_chunks:>7} {fmt:<12} load {load_s * 1000:8.1f}ms  RSS +{rss_loaded:7.1f}MB  "
+                      f"first search {search_s * 1000:6.1f}ms  RSS after search +{rss_searched:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark the FAISS index families in faiss_index_types on synthetic clustered embeddings:
+build time, index size, per-query search latency and recall@k against exact flat search.
+
+Run from the repository root:
+    python -m benchmarks.bench_index_types [n_vectors] [dim] [k]
+"""
+import sys
+import time
+
+import faiss
+import numpy as np
+
+import faiss_index_types
+from faiss_index_types import build_faiss_index, tune_index
+
+N_QUERIES = 200
+
+
+def clustered_vectors(n, dim, n_clusters=200, seed=0):
+    """Unit vectors around random topic centres, roughly how chunk embeddings of a manual cluster."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(n_clusters, dim))
+    vectors = centres[rng.integers(n_clusters, size=n)] + 0.6 * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def run(name, index_type, fp16, vectors, queries, truth, k):
+    faiss_index_types.FAISS_INDEX_FP16 = fp16
+    start = time.perf_counter()
+    index = build_faiss_index(index_type, vectors.shape[1], vectors)
+    index.add(vectors)
+    tune_index(index)
+    build_s = time.perf_counter() - start
+    size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = index.search(query[None, :], k)
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    _, ids = index.search(queries, k)
+    recall = np.mean([len(set(found) & set(expected)) / k for found, expected in zip(ids, truth)])
+    print(f"{name:11s} build {build_s:7.2f}s  size {size_mb:8.1f}MB  "
+          f"search {latency_ms:7.3f}ms/query  recall@{k} {recall:6.3f}")
+
+
+def main():
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    faiss.omp_set_num_threads(1)
+    # Queries come from the same topics as the indexed chunks
+    vectors = clustered_vectors(n_vectors + N_QUERIES, dim)
+    vectors, queries = vectors[:n_vectors], vectors[n_vectors:]
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    print(f"vectors={n_vectors} dim={dim} queries={N_QUERIES} (single thread)")
+    run("flat", "flat", False, vectors, queries, truth, k)
+    run("flat fp16", "flat", True, vectors, queries, truth, k)
+    run("hnsw", "hnsw", False, vectors, queries, truth, k)
+    run("hnsw fp16", "hnsw", True, vectors, queries, truth, k)
+    faiss_index_types.FAISS_IVFPQ_REFINE = False
+    run("ivfpq", "ivfpq", False, vectors, queries, truth, k)
+    faiss_index_types.FAISS_IVFPQ_REFINE = True
+    run("ivfpq+fp16", "ivfpq", False, vectors, queries, truth, k)
+
+
+if __name__ == "__main__":
+    main()
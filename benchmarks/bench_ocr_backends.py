@@ -0,0 +1,62 @@
+"""
+Benchmark the two OCR backends in ocr_utils on synthetic figures:
+one tesseract process per image (pytesseract) against one process per batch
+of images passed through a tesseract list file.
+Both run single-process here so the numbers compare start-up overhead, not parallelism.
+
+Requires the tesseract binary. Run from the repository root:
+    python -m benchmarks.bench_ocr_backends [n_images] [batch_size]
+"""
+import io
+import random
+import shutil
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from ocr_utils import ocr_image, ocr_image_batch
+
+WORDS = ["invoice", "total", "figure", "pump", "valve", "AB-1042", "pressure", "flow", "date", "page"]
+
+
+def synthetic_figure(seed):
+    """A small labelled figure, the kind of image where tesseract start-up dominates."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (rng.randint(200, 400), rng.randint(80, 160)), "white")
+    draw = ImageDraw.Draw(img)
+    for line in range(3):
+        text = " ".join(rng.choices(WORDS, k=3))
+        draw.text((10, 10 + line * 22), text, fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def main():
+    if shutil.which("tesseract") is None:
+        sys.exit("tesseract not found on PATH; install it to compare the OCR backends")
+    n_images = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    images = [synthetic_figure(i) for i in range(n_images)]
+
+    start = time.perf_counter()
+    single_words = sum(len(ocr_image(img_bytes)[0]) for img_bytes in images)
+    single_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    batch_words = 0
+    for i in range(0, n_images, batch_size):
+        batch_words += sum(len(df) for df, _, _ in ocr_image_batch(images[i:i + batch_size]))
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    n_batches = -(-n_images // batch_size)
+    print(f"images={n_images} batch_size={batch_size}")
+    print(f"tesseract processes:   {n_images} per image, {n_batches} batched")
+    print(f"pytesseract per image: {single_ms:9.1f}ms ({single_ms / n_images:6.1f}ms/image, {single_words} words)")
+    print(f"batched list file:     {batch_ms:9.1f}ms ({batch_ms / n_images:6.1f}ms/image, {batch_words} words)")
+    print(f"speedup:               {single_ms / batch_ms:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark exact-text lookups over a session's OCR output: the previous linear scan of every
+.txt file against the positional text index in ocr_txt_search_utils.
+Synthetic images of random words are written as *_coordinates.txt files (as ingest does) and
+indexed; each query is a two-word phrase taken from a random image.
+
+Run from the repository root:
+    python -m benchmarks.bench_text_search [n_images] [words_per_image]
+"""
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from ocr_txt_search_utils import get_text_index
+
+N_QUERIES = 200
+WORDS_PER_LINE = 12
+
+
+def linear_scan(query, output_dir):
+    """The lookup answer_from_txt_files used to do on every query."""
+    snippets = []
+    query_lower = query.lower()
+    for txt_file in glob.glob(os.path.join(output_dir, "*.txt")):
+        with open(txt_file, "r", encoding="utf-8") as f:
+            content = f.read()
+            if query_lower in content.lower():
+                for line in content.split('\n'):
+                    if query_lower in line.lower() and line.strip():
+                        snippets.append((txt_file, line.strip()))
+    return snippets
+
+
+def main():
+    n_images = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    words_per_image = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rng = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(20000)] + [f"PN-{i:05d}" for i in range(2000)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        text_index = get_text_index(output_dir)
+        pages = []
+        index_s = 0.0
+        for i in range(n_images):
+            words = rng.choices(vocabulary, k=words_per_image)
+            rows = [(word, 10 + 60 * (j % WORDS_PER_LINE), 10 + 30 * (j // WORDS_PER_LINE), 50, 20)
+                    for j, word in enumerate(words)]
+            words_df = pd.DataFrame(rows, columns=["text", "left", "top", "width", "height"])
+            words_df.to_csv(os.path.join(output_dir, f"doc.pdf_page{i}_img1_coordinates.txt"), index=False, sep="\t")
+            start = time.perf_counter()
+            text_index.add_words(f"doc.pdf_page{i}_img1.png", None, words_df)
+            index_s += time.perf_counter() - start
+            pages.append(words)
+
+        queries = []
+        for _ in range(N_QUERIES):
+            words = rng.choice(pages)
+            j = rng.randrange(0, len(words) - 1)
+            if j % WORDS_PER_LINE == WORDS_PER_LINE - 1:
+                j -= 1  # keep the phrase on one line
+            queries.append(f'"{words[j]} {words[j + 1]}"')
+
+        start = time.perf_counter()
+        for query in queries[:20]:
+            linear_scan(query.strip('"'), output_dir)
+        scan_ms = (time.perf_counter() - start) * 1000 / 20
+
+        start = time.perf_counter()
+        hits = sum(bool(text_index.search(query)) for query in queries)
+        index_ms = (time.perf_counter() - start) * 1000 / N_QUERIES
+
+    print(f"images={n_images} words/image={words_per_image} (indexing {index_s * 1000 / n_images:.2f}ms/image)")
+    print(f"linear scan of .txt files: {scan_ms:9.3f}ms/query")
+    print(f"positional text index:     {index_ms:9.3f}ms/query ({hits}/{N_QUERIES} phrases found)")
+
+
+if __name__ == "__main__":
+    main()
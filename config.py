@@ -3,4 +3,128 @@ from dotenv import load_dotenv
 
 load_dotenv("keys.env")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or ""
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY") or ""
\ No newline at end of file
+TAVILY_API_KEY = os.getenv("TAVILY_API_KEY") or ""
+
+# OCR worker pool
+# OCR_BACKEND: "pytesseract" (one tesseract process per image) or "batch" (OCR_BATCH_SIZE images per process)
+OCR_BACKEND = os.getenv("OCR_BACKEND") or "pytesseract"
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE") or 16)
+OCR_BATCH_MAX_DELAY_MS = float(os.getenv("OCR_BATCH_MAX_DELAY_MS") or 20)
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS") or os.cpu_count() or 1)
+OCR_MAX_IN_FLIGHT = int(
+    os.getenv("OCR_MAX_IN_FLIGHT")
+    or OCR_MAX_WORKERS * 2 * (OCR_BATCH_SIZE if OCR_BACKEND == "batch" else 1)
+)
+
+# Pages with at least this many selectable words skip OCR and use the PDF text layer
+NATIVE_TEXT_MIN_WORDS = int(os.getenv("NATIVE_TEXT_MIN_WORDS") or 20)
+
+# Tesseract settings (part of the OCR cache key)
+OCR_LANG = os.getenv("OCR_LANG") or "eng"
+OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG") or ""
+
+# Persistent OCR result cache
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR") or "ocr_cache"
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES") or 512 * 1024 * 1024)
+
+# Background ingest jobs
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS") or 2)
+INGEST_MAX_QUEUED_JOBS = int(os.getenv("INGEST_MAX_QUEUED_JOBS") or 20)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY") or 100)
+
+# Chunks sent to the embedding API per request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE") or 100)
+
+# Streaming ingest pipeline: max items waiting between stages
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE") or 8)
+# After the first commit, the index is saved again once INGEST_COMMIT_INTERVAL_S have passed
+# or INGEST_COMMIT_MIN_CHUNKS chunks are waiting (every save rewrites the whole index)
+INGEST_COMMIT_INTERVAL_S = float(os.getenv("INGEST_COMMIT_INTERVAL_S") or 10)
+INGEST_COMMIT_MIN_CHUNKS = int(os.getenv("INGEST_COMMIT_MIN_CHUNKS") or 2000)
+
+# Pre-OCR triage: skip images that are unlikely to contain text, downscale huge ones
+OCR_TRIAGE_ENABLED = (os.getenv("OCR_TRIAGE_ENABLED") or "true").lower() == "true"
+OCR_TRIAGE_MIN_SIDE = int(os.getenv("OCR_TRIAGE_MIN_SIDE") or 16)
+OCR_TRIAGE_MIN_AREA = int(os.getenv("OCR_TRIAGE_MIN_AREA") or 2500)
+OCR_TRIAGE_MIN_ENTROPY = float(os.getenv("OCR_TRIAGE_MIN_ENTROPY") or 0.2)
+OCR_TRIAGE_MIN_EDGE_DENSITY = float(os.getenv("OCR_TRIAGE_MIN_EDGE_DENSITY") or 0.005)
+OCR_TRIAGE_MIN_TEXT_SCORE = float(os.getenv("OCR_TRIAGE_MIN_TEXT_SCORE") or 0.15)
+OCR_TRIAGE_MAX_SIDE = int(os.getenv("OCR_TRIAGE_MAX_SIDE") or 4000)
+
+# OCR time budgets (seconds). A Tesseract call that exceeds the per-image budget is killed and
+# retried with the cheaper settings in OCR_TIMEOUT_RETRIES ("scale:tesseract config;...").
+OCR_IMAGE_TIMEOUT_S = float(os.getenv("OCR_IMAGE_TIMEOUT_S") or 30)
+OCR_UPLOAD_TIMEOUT_S = float(os.getenv("OCR_UPLOAD_TIMEOUT_S") or 600)
+OCR_TIMEOUT_RETRIES = os.getenv("OCR_TIMEOUT_RETRIES") or "0.5:--psm 6;0.35:--psm 6"
+
+# OCR preprocessing: images are resampled so the median text line is about
+# OCR_TARGET_LINE_HEIGHT_PX tall (~10pt text at 300 DPI), deskewed and binarized before Tesseract
+OCR_PREPROCESS_ENABLED = (os.getenv("OCR_PREPROCESS_ENABLED") or "true").lower() == "true"
+OCR_TARGET_LINE_HEIGHT_PX = int(os.getenv("OCR_TARGET_LINE_HEIGHT_PX") or 40)
+OCR_PREPROCESS_MIN_SCALE = float(os.getenv("OCR_PREPROCESS_MIN_SCALE") or 0.25)
+OCR_PREPROCESS_MAX_SCALE = float(os.getenv("OCR_PREPROCESS_MAX_SCALE") or 2.0)
+OCR_PREPROCESS_BINARIZE = (os.getenv("OCR_PREPROCESS_BINARIZE") or "true").lower() == "true"
+OCR_PREPROCESS_MAX_SKEW_DEG = float(os.getenv("OCR_PREPROCESS_MAX_SKEW_DEG") or 5)
+
+# Loaded session indexes kept in memory between chat requests (LRU, estimated bytes)
+VECTOR_STORE_CACHE_MAX_BYTES = int(os.getenv("VECTOR_STORE_CACHE_MAX_BYTES") or 1024 * 1024 * 1024)
+
+# On-disk embedding cache, keyed by embedding model and chunk text hash
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or "embedding_cache"
+
+# Embedding API scheduling: token-budgeted batches, up to EMBEDDING_MAX_CONCURRENCY in flight,
+# halved on rate-limit (429 / quota) responses with exponential backoff
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS") or 16000)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY") or 4)
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES") or 6)
+EMBEDDING_BACKOFF_BASE_S = float(os.getenv("EMBEDDING_BACKOFF_BASE_S") or 1.0)
+EMBEDDING_BACKOFF_MAX_S = float(os.getenv("EMBEDDING_BACKOFF_MAX_S") or 60)
+
+# Embedding provider: "google" (Gemini embedding API) or "local" (offline hashed n-gram
+# embeddings for benchmarks and load tests). Indexes record the provider and refuse to load with another.
+EMBEDDING_PROVIDER = (os.getenv("EMBEDDING_PROVIDER") or "google").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or "models/gemini-embedding-001"
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM") or 384)
+
+# FAISS index family per session: "auto" (by vector count), "flat", "hnsw" or "ivfpq".
+# IVF-PQ trades recall for memory, so "auto" only moves to it when FAISS_IVFPQ_MIN_VECTORS is set (0: never)
+FAISS_INDEX_TYPE = (os.getenv("FAISS_INDEX_TYPE") or "auto").lower()
+FAISS_HNSW_MIN_VECTORS = int(os.getenv("FAISS_HNSW_MIN_VECTORS") or 20000)
+FAISS_IVFPQ_MIN_VECTORS = int(os.getenv("FAISS_IVFPQ_MIN_VECTORS") or 0)
+FAISS_INDEX_FP16 = (os.getenv("FAISS_INDEX_FP16") or "false").lower() == "true"
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M") or 32)
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION") or 80)
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH") or 64)
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST") or 0)  # 0: 4 * sqrt(vector count)
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE") or 16)
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M") or 0)  # 0: derived from the dimension
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE") or 50000)
+FAISS_IVFPQ_REFINE = (os.getenv("FAISS_IVFPQ_REFINE") or "true").lower() == "true"
+FAISS_REFINE_K_FACTOR = int(os.getenv("FAISS_REFINE_K_FACTOR") or 4)
+
+# Memory-map saved FAISS indexes read-only when loading them for chat (chunk texts are read from SQLite per hit)
+FAISS_INDEX_MMAP = (os.getenv("FAISS_INDEX_MMAP") or "true").lower() == "true"
+
+# Chat retrieval: chunks passed to the LLM, and hybrid search fusing FAISS and BM25 keyword
+# rankings (HYBRID_CANDIDATES from each) with reciprocal rank fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K") or 4)
+HYBRID_SEARCH_ENABLED = (os.getenv("HYBRID_SEARCH_ENABLED") or "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES") or 20)
+RRF_K = int(os.getenv("RRF_K") or 60)
+
+# Chat model answering questions; chains and clients are built once per (context type, model, temperature)
+LLM_MODEL = os.getenv("LLM_MODEL") or "gemini-2.0-flash-exp"
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE") or 0.3)
+
+# Chat answer cache per session index version: exact (normalized query) and near-duplicate
+# (query embedding cosine >= ANSWER_CACHE_SIMILARITY) matches, served only for the same retrieved chunks
+ANSWER_CACHE_ENABLED = (os.getenv("ANSWER_CACHE_ENABLED") or "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES") or 1000)
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S") or 3600)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY") or 0.95)
+
+# Conversation context in chat prompts: the last CONTEXT_RECENT_TURNS turns verbatim within
+# CONTEXT_TOKEN_BUDGET tokens (summary included); older turns are folded into a rolling summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET") or 2000)
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS") or 4)
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS") or 300)
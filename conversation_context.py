@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_TURNS, CONTEXT_SUMMARY_MAX_TOKENS
+from embedding_engine import estimate_tokens
+from history import session_history_store, get_summary, save_summary
+from llm_utils import summarize_conversation
+from performance_monitor import performance_monitor
+
+_summary_tasks = {}  # session_id -> running summary update
+
+
+def is_turn(msg):
+    return isinstance(msg, dict) and 'question' in msg and 'answer' in msg
+
+
+def format_turn(msg):
+    return f"User: {msg['question']}\nAssistant: {msg['answer']}\n\n"
+
+
+def build_context_from_history(messages, current_query, summary=None,
+                               token_budget=CONTEXT_TOKEN_BUDGET, recent_turns=CONTEXT_RECENT_TURNS):
+    """
+    Build the conversation part of the prompt.
+    messages: the session history, a list of dicts with 'question' and 'answer' keys
+    current_query: the current user question
+    summary: the session's rolling summary (history.get_summary) of messages[:summary["turns"]]
+    The summary comes first, then up to `recent_turns` of the newest turns it does not cover,
+    verbatim and whole, as long as summary and turns fit in `token_budget` estimated tokens
+    (the current question is not counted). Returns (context, number of messages kept verbatim);
+    update_summary folds every older message into the summary.
+    """
+    summary = summary or {"summary": "", "turns": 0}
+    context = ""
+    if summary["summary"]:
+        context = f"Summary of the earlier conversation:\n{summary['summary']}\n\n"
+    budget = token_budget - estimate_tokens(context)
+
+    recent = []
+    kept = 0
+    for msg in reversed(messages[summary["turns"]:]):
+        if len(recent) >= recent_turns:
+            break
+        if is_turn(msg):
+            turn = format_turn(msg)
+            budget -= estimate_tokens(turn)
+            if budget < 0:
+                break
+            recent.append(turn)
+        kept += 1
+    context += "".join(reversed(recent))
+
+    # Add current query
+    context += f"User: {current_query}\nAssistant: "
+    return context, kept
+
+
+def summary_backlog(session_id):
+    """(history, summary, fold_until): messages[summary["turns"]:fold_until] are in neither the summary nor the prompt."""
+    history = session_history_store.get(session_id, [])
+    summary = get_summary(session_id)
+    _, kept = build_context_from_history(history, "", summary)
+    return history, summary, len(history) - kept
+
+
+def schedule_summary_update(session_id):
+    """
+    After an answer, fold the turns that left the verbatim window (by count or token budget) into
+    the session summary in the background, so the next question does not wait for it. One update
+    runs per session at a time.
+    """
+    task = _summary_tasks.get(session_id)
+    if task is not None and not task.done():
+        return
+    _, summary, fold_until = summary_backlog(session_id)
+    if fold_until <= summary["turns"]:
+        return
+    _summary_tasks[session_id] = asyncio.get_running_loop().create_task(update_summary(session_id))
+
+
+async def update_summary(session_id):
+    # A longer summary leaves less room for verbatim turns, so repeat until nothing is left out
+    while True:
+        history, summary, fold_until = summary_backlog(session_id)
+        if fold_until <= summary["turns"]:
+            return
+        turns = "".join(format_turn(msg) for msg in history[summary["turns"]:fold_until] if is_turn(msg))
+        start_time = time.time()
+        try:
+            text = await summarize_conversation(summary["summary"], turns, max_words=CONTEXT_SUMMARY_MAX_TOKENS * 3 // 4)
+        except Exception as e:
+            print(f"[ERROR] Conversation summary failed: {e}")
+            return
+        summary_time = (time.time() - start_time) * 1000
+        performance_monitor.metrics.setdefault("conversation_summary", []).append(summary_time)
+        print(f"[PERFORMANCE] Conversation Summary: {summary_time:.2f}ms "
+              f"({fold_until - summary['turns']} turns folded, {estimate_tokens(text)} tokens)")
+        # The session was reset while the summary was being written
+        if session_history_store.get(session_id) is not history:
+            return
+        save_summary(session_id, text, fold_until)
@@ -0,0 +1,151 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_DIR
+from performance_monitor import performance_monitor
+
+
+def embedding_cache_key(text):
+    """Content hash of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ModelEmbeddingStore:
+    """
+    Append-only embedding store for one model.
+    - {name}.f32: float32 vectors, one row per cached text, read through np.memmap
+    - {name}.idx: "<sha256 of text>\t<row>" lines, appended only after the row is written
+    - {name}.json: the vector dimension
+    Appends take an flock on the index so several server processes can share the directory;
+    each process picks up rows added by others when it next misses.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.idx")
+        self.meta_path = os.path.join(cache_dir, f"{slug}.json")
+        self.dim = None
+        self.rows = {}  # key -> row
+        self._index_offset = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _refresh(self):
+        """Read index lines appended since the last refresh, and the dimension once another process has recorded it."""
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        # Ignore a trailing partial line; it is re-read once complete
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode("ascii").splitlines():
+            key, row = line.split("\t")
+            self.rows[key] = int(row)
+        self._index_offset += len(complete)
+        self._vectors = None
+
+    def _vector_rows(self):
+        if self._vectors is None and self.rows:
+            # Whole rows only; another process may be mid-append
+            n_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+        return self._vectors
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        with self._lock:
+            if any(key not in self.rows for key in keys):
+                self._refresh()
+            found = [key for key in keys if key in self.rows]
+            if not found:
+                return {}
+            vectors = self._vector_rows()
+            return {key: np.array(vectors[self.rows[key]]) for key in found}
+
+    def put_many(self, keys, vectors):
+        """Append vectors for keys not cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, open(self.index_path, "ab") as index_file:
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    # Written whole before it appears, so other processes never read a partial header
+                    meta_tmp = f"{self.meta_path}.{os.getpid()}.tmp"
+                    with open(meta_tmp, "w") as f:
+                        json.dump({"dim": self.dim}, f)
+                    os.replace(meta_tmp, self.meta_path)
+                new = {}
+                for key, vector in zip(keys, vectors):
+                    if key not in self.rows and key not in new:
+                        new[key] = vector
+                if not new:
+                    return
+                row_bytes = 4 * self.dim
+                with open(self.vectors_path, "ab") as f:
+                    end = f.tell()
+                    if end % row_bytes:
+                        # Drop a torn row left by an interrupted write
+                        end -= end % row_bytes
+                        f.truncate(end)
+                    start_row = end // row_bytes
+                    f.write(np.stack(list(new.values())).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                lines = "".join(f"{key}\t{start_row + i}\n" for i, key in enumerate(new))
+                index_file.write(lines.encode("ascii"))
+                index_file.flush()
+                self._refresh()
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model name, sha256 of the chunk text)."""
+
+    def __init__(self, cache_dir=EMBEDDING_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._stores = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _store(self, model_name):
+        with self._lock:
+            if model_name not in self._stores:
+                self._stores[model_name] = ModelEmbeddingStore(self.cache_dir, model_name)
+            return self._stores[model_name]
+
+    def get_many(self, model_name, texts):
+        """Return a list with the cached vector of each text, or None where it is not cached."""
+        keys = [embedding_cache_key(text) for text in texts]
+        found = self._store(model_name).get_many(keys)
+        performance_monitor.increment("embedding_cache_hits", sum(1 for key in keys if key in found))
+        performance_monitor.increment("embedding_cache_misses", sum(1 for key in keys if key not in found))
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model_name, texts, vectors):
+        self._store(model_name).put_many([embedding_cache_key(text) for text in texts], vectors)
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+
+from config import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TOKENS, EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES, EMBEDDING_BACKOFF_BASE_S, EMBEDDING_BACKOFF_MAX_S,
+)
+from performance_monitor import performance_monitor
+
+RATE_LIMIT_MARKERS = ("429", "quota", "rate limit", "resource_exhausted", "resource has been exhausted")
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token), enough to size request batches."""
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts, token_budget=EMBEDDING_BATCH_TOKENS, max_batch_size=EMBEDDING_BATCH_SIZE):
+    """Split texts, in order, into batches of at most max_batch_size texts and about token_budget tokens."""
+    batches, batch, batch_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > token_budget):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def is_rate_limit_error(error):
+    """True for 429 / quota errors, looking through wrapped exceptions."""
+    while error is not None:
+        for attr in ("code", "status_code", "status"):
+            value = getattr(error, attr, None)
+            value = value() if callable(value) else value
+            if value == 429 or str(value) in ("429", "StatusCode.RESOURCE_EXHAUSTED"):
+                return True
+        if any(marker in str(error).lower() for marker in RATE_LIMIT_MARKERS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class EmbeddingEngine:
+    """
+    Async embedding scheduler in front of a LangChain embeddings client.
+    Texts are packed into token-budgeted batches and up to `limit` batches are in flight at once.
+    The limit adapts like TCP congestion control: it is halved on every rate-limit (429 / quota)
+    response, which also pauses all new requests for an exponential backoff with jitter, and grows
+    by one after `limit` consecutive successes, up to max_concurrency.
+    """
+
+    def __init__(self, embedding_model, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                 batch_tokens=EMBEDDING_BATCH_TOKENS, max_batch_size=EMBEDDING_BATCH_SIZE,
+                 max_retries=EMBEDDING_MAX_RETRIES, backoff_base_s=EMBEDDING_BACKOFF_BASE_S,
+                 backoff_max_s=EMBEDDING_BACKOFF_MAX_S):
+        self.embedding_model = embedding_model
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.limit = self.max_concurrency
+        self._active = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._condition = None
+        self._loop = None
+
+    def _get_condition(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._condition, self._active = loop, asyncio.Condition(), 0
+        return self._condition
+
+    async def _acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def _release(self):
+        condition = self._get_condition()
+        async with condition:
+            self._active -= 1
+            condition.notify_all()
+
+    def _on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_concurrency:
+            self.limit += 1
+            self._successes = 0
+
+    def _on_rate_limited(self, attempt):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        backoff = min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt) * random.uniform(0.5, 1.5)
+        self._resume_at = max(self._resume_at, time.monotonic() + backoff)
+        performance_monitor.increment("embedding_rate_limited")
+        print(f"[EMBEDDING] Rate limited; concurrency {self.limit}, backing off {backoff:.2f}s")
+
+    async def _embed_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._acquire()
+            try:
+                vectors = await asyncio.to_thread(self.embedding_model.embed_documents, batch)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self._on_rate_limited(attempt)
+                continue
+            finally:
+                await self._release()
+            self._on_success()
+            return vectors
+
+    async def embed(self, texts, stats=None):
+        """
+        Embed texts and return one vector per text, in order.
+        `stats` is an optional Counter receiving embedding_api_chunks and embedding_api_ms.
+        """
+        if not texts:
+            return []
+        start_time = time.time()
+        batches = pack_batches(texts, self.batch_tokens, self.max_batch_size)
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        elapsed_ms = (time.time() - start_time) * 1000
+        performance_monitor.metrics.setdefault("embedding_api", []).append(elapsed_ms)
+        print(f"[PERFORMANCE] Embedded {len(texts)} chunks in {len(batches)} batches: {elapsed_ms:.2f}ms "
+              f"({len(texts) / max(elapsed_ms / 1000, 1e-6):.1f} chunks/s, concurrency {self.limit})")
+        if stats is not None:
+            stats["embedding_api_chunks"] += len(texts)
+            stats["embedding_api_ms"] += elapsed_ms
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+def embedding_chunks_per_s(stats):
+    """Embedding API throughput over an upload, from the counters EmbeddingEngine.embed fills in."""
+    if not stats["embedding_api_ms"]:
+        return None
+    return stats["embedding_api_chunks"] / (stats["embedding_api_ms"] / 1000)
+
+
+_embedding_engine = None
+
+
+def get_embedding_engine(embedding_model):
+    """Return the process-wide engine, so rate-limit state is shared by every upload."""
+    global _embedding_engine
+    if _embedding_engine is None or _embedding_engine.embedding_model is not embedding_model:
+        _embedding_engine = EmbeddingEngine(embedding_model)
+    return _embedding_engine
@@ -0,0 +1,73 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from pydantic import SecretStr
+
+from config import GOOGLE_API_KEY, EMBEDDING_PROVIDER, EMBEDDING_MODEL, LOCAL_EMBEDDING_DIM
+
+# Character n-gram lengths hashed by the local backend
+NGRAM_SIZES = (3, 4, 5)
+# Odd 64-bit multipliers for the polynomial n-gram hash and the bucket mix
+HASH_BASE = np.uint64(0x100000001B3)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Fast, offline embeddings: hashed character n-grams projected to `dim` dense dimensions.
+    Every 3/4/5-gram of the lowercased text is hashed to a bucket and a sign (the hashing trick);
+    bucket counts are log-scaled and the vector is L2-normalised, so cosine and L2 distances
+    reflect shared n-grams. Needs no model files or network, so it suits benchmarks and load tests,
+    not answer quality.
+    """
+
+    def __init__(self, dim=LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.model = f"local-hashing-{dim}"
+        self._powers = {n: HASH_BASE ** np.arange(n, dtype=np.uint64) for n in NGRAM_SIZES}
+
+    def _embed(self, text):
+        data = np.frombuffer(f" {text.lower()} ".encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        vector = np.zeros(self.dim)
+        for n, powers in self._powers.items():
+            if data.size < n:
+                continue
+            with np.errstate(over="ignore"):
+                hashes = np.lib.stride_tricks.sliding_window_view(data, n) @ powers
+                mixed = hashes * HASH_MIX
+            buckets = (mixed >> np.uint64(33)) % np.uint64(self.dim)
+            signs = np.where(mixed & np.uint64(1), 1.0, -1.0)
+            vector += np.bincount(buckets.astype(np.int64), weights=signs, minlength=self.dim)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def create_embedding_model(provider=EMBEDDING_PROVIDER):
+    """Embeddings client for EMBEDDING_PROVIDER: "google" (Gemini API) or "local" (HashingEmbeddings)."""
+    if provider == "google":
+        return GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=SecretStr(GOOGLE_API_KEY))
+    if provider == "local":
+        return HashingEmbeddings()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+
+
+def embedding_signature(embedding_model, dim=None):
+    """What an index was embedded with, stored beside it and checked when it is loaded."""
+    if isinstance(embedding_model, HashingEmbeddings):
+        provider = "local"
+    elif isinstance(embedding_model, GoogleGenerativeAIEmbeddings):
+        provider = "google"
+    else:
+        provider = type(embedding_model).__name__
+    return {
+        "provider": provider,
+        "model": getattr(embedding_model, "model", type(embedding_model).__name__),
+        "dim": dim if dim is not None else getattr(embedding_model, "dim", None),
+    }
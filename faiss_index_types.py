@@ -0,0 +1,105 @@
+import math
+
+import faiss
+import numpy as np
+
+from config import (
+    FAISS_INDEX_TYPE, FAISS_HNSW_MIN_VECTORS, FAISS_IVFPQ_MIN_VECTORS, FAISS_INDEX_FP16,
+    FAISS_HNSW_M, FAISS_HNSW_EF_CONSTRUCTION, FAISS_HNSW_EF_SEARCH,
+    FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_PQ_M, FAISS_TRAIN_SAMPLE, FAISS_IVFPQ_REFINE, FAISS_REFINE_K_FACTOR,
+)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+# Product quantization with 8-bit codes trains 256 centroids per sub-vector
+PQ_CENTROIDS = 256
+
+
+def choose_index_type(n_vectors, index_type=FAISS_INDEX_TYPE):
+    """
+    Index family for a session index holding n_vectors vectors.
+    "auto" picks exact flat search for small indexes and HNSW from FAISS_HNSW_MIN_VECTORS;
+    IVF-PQ loses recall, so it only follows from FAISS_IVFPQ_MIN_VECTORS when that is set.
+    IVF-PQ needs enough vectors to train, so smaller indexes fall back to flat even when it
+    is configured explicitly.
+    """
+    if index_type == "auto":
+        if FAISS_IVFPQ_MIN_VECTORS and n_vectors >= FAISS_IVFPQ_MIN_VECTORS:
+            index_type = "ivfpq"
+        elif n_vectors >= FAISS_HNSW_MIN_VECTORS:
+            index_type = "hnsw"
+        else:
+            index_type = "flat"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE: {index_type}")
+    # FAISS wants about 39 training points per centroid
+    if index_type == "ivfpq" and n_vectors < max(ivf_nlist(n_vectors), PQ_CENTROIDS) * 39:
+        return "flat"
+    return index_type
+
+
+def index_type_of(index):
+    """The INDEX_TYPES family of an existing FAISS index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, (faiss.IndexIVF, faiss.IndexRefine)):
+        return "ivfpq"
+    return "flat"
+
+
+def ivf_nlist(n_vectors):
+    return FAISS_IVF_NLIST or max(1, int(4 * math.sqrt(n_vectors)))
+
+
+def pq_subquantizers(dim):
+    """Number of PQ sub-vectors: FAISS_PQ_M, or the largest divisor of dim giving sub-vectors of >= 8 dims."""
+    if FAISS_PQ_M:
+        return FAISS_PQ_M
+    return max(m for m in range(1, min(dim, 64) + 1) if (dim % m == 0 and dim // m >= 8) or m == 1)
+
+
+def build_faiss_index(index_type, dim, training_vectors=None):
+    """
+    Create an empty L2 index of the given family, trained on a sample of training_vectors when needed.
+    FAISS_INDEX_FP16 stores flat and HNSW vectors as float16, halving their memory. With
+    FAISS_IVFPQ_REFINE, IVF-PQ results are re-ranked against float16 copies of the vectors.
+    """
+    fp16 = faiss.ScalarQuantizer.QT_fp16
+    if index_type == "flat":
+        index = faiss.IndexScalarQuantizer(dim, fp16) if FAISS_INDEX_FP16 else faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        if FAISS_INDEX_FP16:
+            index = faiss.IndexHNSWSQ(dim, fp16, FAISS_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    else:
+        nlist = ivf_nlist(len(training_vectors))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_subquantizers(dim), 8)
+        if FAISS_IVFPQ_REFINE:
+            # Re-rank the PQ candidates with float16 copies of the vectors
+            index = faiss.IndexRefine(index, faiss.IndexScalarQuantizer(dim, fp16))
+    if not index.is_trained:
+        sample = training_vectors
+        if len(sample) > FAISS_TRAIN_SAMPLE:
+            rows = np.random.default_rng(0).choice(len(sample), FAISS_TRAIN_SAMPLE, replace=False)
+            sample = sample[rows]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    tune_index(index)
+    return index
+
+
+def tune_index(index):
+    """Apply the configured search-time parameters (they are not all saved with the index)."""
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = FAISS_REFINE_K_FACTOR
+        tune_index(faiss.downcast_index(index.base_index))
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = FAISS_IVF_NPROBE
+    return index
+
+
+def index_vectors(index):
+    """All vectors stored in a flat or HNSW index (float16 storage is decoded), for rebuilding it."""
+    return index.reconstruct_n(0, index.ntotal)
@@ -1,4 +1,6 @@
 session_history_store = {}
+# Rolling summary of each session's older turns: {"summary": text, "turns": history entries folded into it}
+session_summary_store = {}
 
 def save_history(session_id: str, question: str, answer: str, model_name: str, timestamp: str, pdf_names: str):
     entry = {
@@ -13,5 +15,13 @@ def save_history(session_id: str, question: str, answer: str, model_name: str, t
 def get_history(session_id: str) -> list:
     return session_history_store.get(session_id, [])
 
+def get_summary(session_id: str) -> dict:
+    return session_summary_store.get(session_id, {"summary": "", "turns": 0})
+
+def save_summary(session_id: str, summary: str, turns: int):
+    session_summary_store[session_id] = {"summary": summary, "turns": turns}
+
 def clear_history(session_id: str):
-    session_history_store.pop(session_id, None) 
\ No newline at end of file
+    session_history_store.pop(session_id, None)
+    session_summary_store.pop(session_id, None)
+ 
\ No newline at end of file
@@ -0,0 +1,66 @@
+import re
+import time
+
+from config import RETRIEVAL_K, HYBRID_SEARCH_ENABLED, HYBRID_CANDIDATES, RRF_K
+from sqlite_docstore import SQLiteDocstore
+
+
+def keyword_match_expression(query):
+    """
+    FTS5 expression matching any word of the query. Each word is quoted as a phrase of its
+    tokens, so identifiers such as "AB-1234" or "v2.1" only match with their parts adjacent.
+    """
+    phrases = []
+    for word in query.split():
+        tokens = re.findall(r"\w+", word)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " OR ".join(dict.fromkeys(phrases))
+
+
+def keyword_search(vector_store, query, k):
+    """Top k chunks by BM25 from the session's keyword index; empty for indexes saved without one."""
+    match = keyword_match_expression(query)
+    if not match or not isinstance(vector_store.docstore, SQLiteDocstore):
+        return []
+    return vector_store.docstore.keyword_search(match, k)
+
+
+def reciprocal_rank_fusion(rankings, limit, k=RRF_K):
+    """Merge ranked document lists: each document scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:limit]]
+
+
+def hybrid_search(vector_store, query, k=RETRIEVAL_K, embedding=None):
+    """
+    Retrieve k chunks for a query. With HYBRID_SEARCH_ENABLED the FAISS and BM25 rankings
+    (HYBRID_CANDIDATES each) are fused, so exact identifiers and OCR-garbled passages that
+    embeddings miss can still be found. Pass the query `embedding` if it is already computed.
+    Returns (docs, timings in ms per retriever).
+    """
+    timings = {}
+    start_time = time.time()
+    vector_k = max(k, HYBRID_CANDIDATES) if HYBRID_SEARCH_ENABLED else k
+    if embedding is None:
+        vector_docs = vector_store.similarity_search(query, k=vector_k)
+    else:
+        vector_docs = vector_store.similarity_search_by_vector(embedding, k=vector_k)
+    timings["vector_search_ms"] = (time.time() - start_time) * 1000
+    if not HYBRID_SEARCH_ENABLED:
+        return vector_docs, timings
+
+    start_time = time.time()
+    keyword_docs = keyword_search(vector_store, query, max(k, HYBRID_CANDIDATES))
+    timings["keyword_search_ms"] = (time.time() - start_time) * 1000
+
+    start_time = time.time()
+    docs = reciprocal_rank_fusion([vector_docs, keyword_docs], k)
+    timings["rank_fusion_ms"] = (time.time() - start_time) * 1000
+    return docs, timings
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from uuid import uuid4
+
+from config import INGEST_MAX_CONCURRENT_JOBS, INGEST_MAX_QUEUED_JOBS, INGEST_JOB_HISTORY
+from ingest_pipeline import StreamingIngest, StageClock
+
+# A job in one of these states will not change again
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class InMemoryUploadFile:
+    """Minimal UploadFile stand-in so a job can outlive the request that uploaded its files."""
+
+    def __init__(self, filename, contents):
+        self.filename = filename
+        self.contents = contents
+
+    async def read(self):
+        return self.contents
+
+
+class IngestJob:
+    """State and per-stage progress of one background upload."""
+
+    STAGES = StreamingIngest.STAGES
+
+    def __init__(self, session_id, pdf_names):
+        self.job_id = str(uuid4())
+        self.session_id = session_id
+        self.pdf_names = pdf_names
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.stats = Counter()
+        self.stages = {stage: "pending" for stage in self.STAGES}
+        self.stage_clocks = {stage: StageClock() for stage in self.STAGES}
+        self._started = None
+        self._finished = None
+
+    def start(self):
+        self.status = "running"
+        self._started = time.time()
+
+    def finish(self):
+        self._finished = time.time()
+        self.finished_at = datetime.now().isoformat()
+
+    def start_stage(self, stage):
+        self.stages[stage] = "running"
+
+    def finish_stage(self, stage):
+        self.stages[stage] = "completed"
+
+    def wall_ms(self):
+        """Time since the job started running, until it finished."""
+        if self._started is None:
+            return None
+        return ((self._finished or time.time()) - self._started) * 1000
+
+    def to_dict(self):
+        # busy_ms is the time the stage spent working, not waiting on the stages around it; the
+        # stages run concurrently, so their busy times overlap and may add up to more than wall_ms
+        stages = {
+            stage: {"status": status, "busy_ms": self.stage_clocks[stage].busy_ms()}
+            for stage, status in self.stages.items()
+        }
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "pdf_names": self.pdf_names,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "wall_ms": self.wall_ms(),
+            "progress": dict(self.stats),
+            # This upload answers chats from its first index commit onwards
+            "searchable": self.stats["chunks_indexed"] > 0,
+            "stages": stages,
+            "result": self.result,
+        }
+
+
+class IngestJobScheduler:
+    """
+    Runs uploads in the background on the server's event loop.
+    At most INGEST_MAX_CONCURRENT_JOBS jobs run at once and at most
+    INGEST_MAX_QUEUED_JOBS may be waiting; finished jobs are kept for polling
+    up to INGEST_JOB_HISTORY entries.
+    """
+
+    def __init__(self, max_concurrent=INGEST_MAX_CONCURRENT_JOBS, max_queued=INGEST_MAX_QUEUED_JOBS,
+                 history=INGEST_JOB_HISTORY):
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._tasks = {}  # task -> job, for the jobs still queued or running
+
+    def queued_count(self):
+        return sum(1 for job in self.jobs.values() if job.status == "queued")
+
+    def submit(self, session_id, files):
+        """
+        Queue an ingest job for already-read files (a list of InMemoryUploadFile).
+        Raises RuntimeError when the queue is full.
+        """
+        if self.queued_count() >= self.max_queued:
+            raise RuntimeError("Too many ingest jobs queued, try again later.")
+        job = IngestJob(session_id, [f.filename for f in files])
+        self.jobs[job.job_id] = job
+        self._prune()
+        task = asyncio.create_task(self._run(job, files))
+        self._tasks[task] = job
+        task.add_done_callback(lambda task: self._tasks.pop(task, None))
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def cancel_session(self, session_id):
+        """Cancel the session's queued and running jobs and wait until they have stopped."""
+        tasks = [task for task, job in self._tasks.items() if job.session_id == session_id]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return len(tasks)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job, files):
+        try:
+            async with self._semaphore:
+                job.start()
+                job.result = await run_ingest(job, files)
+                job.status = "completed"
+        except asyncio.CancelledError:
+            # Queued or running; the task must still end cancelled
+            job.status = "cancelled"
+            print(f"[INGEST] Job {job.job_id} cancelled")
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"[INGEST] Job {job.job_id} failed: {e}")
+        finally:
+            job.finish()
+
+
+async def run_ingest(job, files):
+    """Run the streaming ingest pipeline for `job`; the index becomes searchable after the first commit."""
+    return await StreamingIngest(job.session_id, job=job).run(files)
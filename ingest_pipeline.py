@@ -0,0 +1,322 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+
+from config import (
+    INGEST_QUEUE_SIZE, INGEST_COMMIT_INTERVAL_S, INGEST_COMMIT_MIN_CHUNKS,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY, OCR_MAX_IN_FLIGHT,
+)
+from ocr_utils import OcrBudget, ocr_image_cached, estimated_ocr_time_saved_ms
+from pdf_utils import (
+    collect_session_documents, iter_pdf_pages, is_text_page, native_page_chunks,
+    ocr_image_chunks, persist_ocr_artifacts, make_text_splitter,
+)
+from vectorstore_utils import (
+    get_embedding_model, save_vector_store, embed_documents_cached, append_embeddings,
+    chunk_id, session_write_lock, read_vector_store_if_exists,
+)
+from ocr_txt_search_utils import get_text_index
+from embedding_engine import embedding_chunks_per_s
+from performance_monitor import performance_monitor
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class StageClock:
+    """
+    Busy time of one pipeline stage: the wall time during which at least one of its work items
+    is being processed. Time spent waiting on the stage's input or output queue is not counted,
+    and overlapping items (concurrent OCR or embedding batches) are counted once.
+    """
+
+    def __init__(self):
+        self._active = 0
+        self._since = None
+        self._busy_s = 0.0
+
+    def begin(self):
+        if self._active == 0:
+            self._since = time.time()
+        self._active += 1
+
+    def end(self):
+        self._active -= 1
+        if self._active == 0:
+            self._busy_s += time.time() - self._since
+
+    @contextmanager
+    def busy(self):
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def busy_ms(self):
+        busy_s = self._busy_s
+        if self._active:
+            busy_s += time.time() - self._since
+        return busy_s * 1000
+
+
+class StreamingIngest:
+    """
+    Staged ingest pipeline: extract -> OCR -> chunk -> embed -> index.
+    The stages run concurrently and hand work over through bounded queues of
+    INGEST_QUEUE_SIZE items. The index stage commits the first chunks to the session's
+    FAISS index at once and later ones in throttled increments (INGEST_COMMIT_INTERVAL_S,
+    INGEST_COMMIT_MIN_CHUNKS), so /chat/ can answer from the pages indexed so far while
+    the rest of the upload is still being processed.
+    """
+
+    STAGES = ("extraction", "ocr", "chunking", "embedding", "indexing")
+
+    def __init__(self, session_id, job=None):
+        self.session_id = session_id
+        self.job = job
+        self.stats = job.stats if job is not None else Counter()
+        self.output_dir = f"pdf_output/{session_id or 'default'}"
+        self.text_splitter = make_text_splitter()
+        self.embedding_model = get_embedding_model()
+        self.vector_store = None
+        self.text_parts = []
+        self.clocks = job.stage_clocks if job is not None else {stage: StageClock() for stage in self.STAGES}
+        self.first_commit_ms = None
+        self.ocr_budget = None
+        self.known_ids = set()
+        self._started_at = None
+
+    async def run(self, files):
+        """Ingest `files` and return the same summary as the synchronous upload endpoints."""
+        self._started_at = time.time()
+        self.ocr_budget = OcrBudget()
+        os.makedirs(self.output_dir, exist_ok=True)
+        pdf_names, documents = await collect_session_documents(files, self.output_dir)
+        for _, contents in documents:
+            with fitz.open(stream=contents, filetype="pdf") as doc:
+                self.stats["pages_total"] += doc.page_count
+
+        async with session_write_lock(self.session_id):
+            # Extend the session's existing index (a private copy; chats keep using the registry's)
+            self.vector_store = await asyncio.to_thread(read_vector_store_if_exists, self.session_id)
+            if self.vector_store is not None:
+                self.known_ids = set(self.vector_store.index_to_docstore_id.values())
+                self.stats["chunks_existing"] = len(self.known_ids)
+            await self._run_stages(documents)
+
+        ocr_full_text = "".join(self.text_parts)
+        with open(os.path.join(self.output_dir, "ocr_full_text.txt"), "a", encoding="utf-8") as f:
+            f.write(ocr_full_text)
+        if self.stats["chunks_total"] == 0:
+            raise ValueError("No text extracted from PDFs.")
+
+        total_ms = (time.time() - self._started_at) * 1000
+        performance_monitor.metrics.setdefault("ingest_pipeline", []).append(total_ms)
+        busy_ms = {stage: clock.busy_ms() for stage, clock in self.clocks.items()}
+        for stage, ms in busy_ms.items():
+            performance_monitor.metrics.setdefault(f"ingest_{stage}_busy", []).append(ms)
+        print(f"[PERFORMANCE] Streaming ingest: {total_ms:.2f}ms "
+              f"(first index commit after {self.first_commit_ms or 0:.2f}ms)")
+        return {
+            "session_id": self.session_id,
+            "pdf_names": pdf_names,
+            "chunks": self.stats["chunks_indexed"],
+            "performance_metrics": {
+                "ingest_total_ms": total_ms,
+                "time_to_first_index_commit_ms": self.first_commit_ms,
+                "images_skipped": self.stats["images_skipped"],
+                "chunks_deduplicated": self.stats["chunks_deduplicated"],
+                "embeddings_cached": self.stats["embeddings_cached"],
+                "embedding_chunks_per_s": embedding_chunks_per_s(self.stats),
+                "ocr_time_saved_ms": estimated_ocr_time_saved_ms(self.stats),
+                **self.ocr_budget.to_dict(),
+                # The stages overlap, so their busy times add up to more than ingest_total_ms
+                **{f"{stage}_busy_ms": ms for stage, ms in busy_ms.items()}
+            }
+        }
+
+    async def _run_stages(self, documents):
+        pages, ocr_pages, batches, embedded = (asyncio.Queue(maxsize=INGEST_QUEUE_SIZE) for _ in range(4))
+        stage_coros = {
+            "extraction": self._extract(documents, pages),
+            "ocr": self._ocr(pages, ocr_pages),
+            "chunking": self._chunk(ocr_pages, batches),
+            "embedding": self._embed(batches, embedded),
+            "indexing": self._index(embedded),
+        }
+        tasks = [asyncio.create_task(self._timed(name, coro)) for name, coro in stage_coros.items()]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def _timed(self, stage, coro):
+        if self.job is not None:
+            self.job.start_stage(stage)
+        await coro
+        if self.job is not None:
+            self.job.finish_stage(stage)
+
+    async def _extract(self, documents, out_q):
+        for filename, contents in documents:
+            pages = iter_pdf_pages(filename, contents)
+            # PyMuPDF work is blocking; parse one page at a time off the event loop
+            while True:
+                with self.clocks["extraction"].busy():
+                    page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    break
+                self.stats["pages_extracted"] += 1
+                await out_q.put((filename, *page))
+        await out_q.put(_DONE)
+
+    async def _ocr(self, in_q, out_q):
+        # At most OCR_MAX_IN_FLIGHT images are OCRed at once, as in ocr_utils.ocr_images
+        ocr_slots = asyncio.Semaphore(max(1, OCR_MAX_IN_FLIGHT))
+        clock = self.clocks["ocr"]
+
+        def ocr_done(_):
+            ocr_slots.release()
+            clock.end()
+
+        while (item := await in_q.get()) is not _DONE:
+            filename, page_num, words_df, page_rect, images = item
+            # Start OCR for the page's images as slots free up; the chunk stage awaits them in order
+            ocr_tasks = []
+            for image_name, image_number, img_bytes in images:
+                await ocr_slots.acquire()
+                clock.begin()
+                ocr_task = asyncio.ensure_future(ocr_image_cached(img_bytes, self.stats, self.ocr_budget, image_name))
+                ocr_task.add_done_callback(ocr_done)
+                ocr_tasks.append((image_name, image_number, img_bytes, ocr_task))
+            await out_q.put((filename, page_num, words_df, page_rect, ocr_tasks))
+        await out_q.put(_DONE)
+
+    async def _chunk(self, in_q, out_q):
+        batch = []
+        clock = self.clocks["chunking"]
+        while (item := await in_q.get()) is not _DONE:
+            filename, page_num, words_df, page_rect, ocr_tasks = item
+            if is_text_page(words_df):
+                with clock.busy():
+                    page_text, chunk_metas = native_page_chunks(filename, page_num, words_df, page_rect, self.text_splitter)
+                    get_text_index(self.output_dir).add_words(filename, page_num + 1, words_df)
+                    self.text_parts.append(f"File: {filename} (page {page_num+1})\n{page_text}\n\n")
+                    batch.extend(self._new_chunks(chunk_metas))
+            for image_name, image_number, img_bytes, ocr_task in ocr_tasks:
+                sorted_df, img_width, img_height = await ocr_task
+                self.stats["images_ocred"] += 1
+                if sorted_df.empty:
+                    continue
+                with clock.busy():
+                    persist_ocr_artifacts(self.output_dir, image_name, img_bytes, sorted_df)
+                    page_text, chunk_metas = ocr_image_chunks(
+                        image_name, image_number, sorted_df, img_width, img_height, self.text_splitter
+                    )
+                    self.text_parts.append(f"File: {image_name}\n{page_text}\n\n")
+                    batch.extend(self._new_chunks(chunk_metas))
+
+            # Send full batches, and whatever is ready when nothing else is waiting
+            while len(batch) >= EMBEDDING_BATCH_SIZE:
+                await out_q.put(batch[:EMBEDDING_BATCH_SIZE])
+                batch = batch[EMBEDDING_BATCH_SIZE:]
+            if batch and in_q.empty():
+                await out_q.put(batch)
+                batch = []
+        if batch:
+            await out_q.put(batch)
+        await out_q.put(_DONE)
+
+    def _new_chunks(self, chunk_metas):
+        """(chunk, metadata, id) for the chunks not already in the session index."""
+        self.stats["chunks_total"] += len(chunk_metas)
+        new_chunks = []
+        for chunk, meta in chunk_metas:
+            cid = chunk_id(chunk, meta)
+            if cid in self.known_ids:
+                self.stats["chunks_deduplicated"] += 1
+                continue
+            self.known_ids.add(cid)
+            new_chunks.append((chunk, meta, cid))
+        return new_chunks
+
+    async def _embed(self, in_q, out_q):
+        # Keep several batches in flight; the embedding engine bounds the actual API concurrency
+        pending = deque()
+        try:
+            while (batch := await in_q.get()) is not _DONE:
+                pending.append(asyncio.ensure_future(self._embed_batch(batch)))
+                while pending and (pending[0].done() or len(pending) >= EMBEDDING_MAX_CONCURRENCY):
+                    await out_q.put(await pending.popleft())
+            while pending:
+                await out_q.put(await pending.popleft())
+        finally:
+            for task in pending:
+                task.cancel()
+        await out_q.put(_DONE)
+
+    async def _embed_batch(self, batch):
+        texts = [chunk for chunk, _, _ in batch]
+        with self.clocks["embedding"].busy():
+            vectors = await embed_documents_cached(self.embedding_model, texts, self.stats)
+        return texts, vectors, [meta for _, meta, _ in batch], [cid for _, _, cid in batch]
+
+    async def _index(self, in_q):
+        clock = self.clocks["indexing"]
+        uncommitted = 0
+        last_commit = time.time()
+        finished = False
+        while not finished:
+            item = await in_q.get()
+            if item is _DONE:
+                break
+            # Fold everything already embedded into a single commit
+            items = [item]
+            while not in_q.empty():
+                item = in_q.get_nowait()
+                if item is _DONE:
+                    finished = True
+                    break
+                items.append(item)
+            texts, vectors, metadatas, ids = ([x for item in items for x in item[i]] for i in range(4))
+            with clock.busy():
+                await self._in_thread(self._append, texts, vectors, metadatas, ids)
+            uncommitted += len(texts)
+            # Every save rewrites the whole index: publish the first chunks at once, then throttle
+            if (self.first_commit_ms is None or uncommitted >= INGEST_COMMIT_MIN_CHUNKS
+                    or time.time() - last_commit >= INGEST_COMMIT_INTERVAL_S):
+                with clock.busy():
+                    await self._in_thread(self._commit, uncommitted)
+                uncommitted = 0
+                last_commit = time.time()
+        if uncommitted:
+            with clock.busy():
+                await self._in_thread(self._commit, uncommitted)
+
+    @staticmethod
+    async def _in_thread(func, *args):
+        # A cancelled job must not leave a save running after it released the session's write lock
+        work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            await asyncio.wait([work])
+            raise
+
+    def _append(self, texts, vectors, metadatas, ids):
+        self.vector_store = append_embeddings(self.vector_store, texts, vectors, metadatas, ids, self.embedding_model)
+
+    def _commit(self, n_chunks):
+        save_vector_store(self.vector_store, self.session_id)
+        self.stats["chunks_indexed"] += n_chunks
+        self.stats["index_commits"] += 1
+        if self.first_commit_ms is None:
+            self.first_commit_ms = (time.time() - self._started_at) * 1000
+            performance_monitor.metrics.setdefault("time_to_first_index_commit", []).append(self.first_commit_ms)
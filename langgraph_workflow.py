@@ -1,11 +1,16 @@
 from typing_extensions import TypedDict, Annotated
 from langgraph.graph import StateGraph, END
-from llm_utils import get_chain
+from llm_utils import get_chain, get_tavily_client
 from vectorstore_utils import load_vector_store
-from history import save_history
+from hybrid_retriever import hybrid_search
+from answer_cache import get_answer_cache, depends_on_context
+from config import ANSWER_CACHE_ENABLED
+from history import save_history, get_summary
+from conversation_context import build_context_from_history, schedule_summary_update
+from embedding_engine import estimate_tokens
 from performance_monitor import performance_monitor
 from datetime import datetime
-from config import TAVILY_API_KEY
+import asyncio
 import os
 import time
 
@@ -18,80 +23,136 @@ class ChatState(TypedDict, total=False):
     messages: list  # Changed: removed add_messages annotation
     vector_store: object
     docs: object
+    query_embedding: list
+    cacheable: bool
+    cached: bool
 
-def load_vector_store_node(state: ChatState):
+async def load_vector_store_node(state: ChatState):
     start_time = time.time()
     session_id = state.get("session_id", "")
-    vector_store = load_vector_store(session_id)
+    # A registry miss reads the index from disk; keep that off the event loop
+    vector_store = await asyncio.to_thread(load_vector_store, session_id)
     vector_load_time = (time.time() - start_time) * 1000
     performance_monitor.metrics["vector_store_loading"].append(vector_load_time)
     print(f"[PERFORMANCE] Vector Store Loading: {vector_load_time:.2f}ms")
     return {"vector_store": vector_store, "performance": {"vector_store_loading_ms": vector_load_time}}
 
-def similarity_search_node(state: ChatState):
+async def similarity_search_node(state: ChatState):
     vector_store = state.get("vector_store")
     query = state.get("query", "")
     start_time = time.time()
-    docs = vector_store.similarity_search(query)
+    # Query embedding (an API call) and the FAISS / SQLite searches are blocking.
+    # The embedding is kept in the state for the answer cache's near-duplicate lookup.
+    query_embedding = await asyncio.to_thread(vector_store.embeddings.embed_query, query)
+    timings = {"query_embedding_ms": (time.time() - start_time) * 1000}
+    docs, search_timings = await asyncio.to_thread(hybrid_search, vector_store, query, embedding=query_embedding)
+    timings.update(search_timings)
     search_time = (time.time() - start_time) * 1000
     performance_monitor.metrics["similarity_search"].append(search_time)
-    print(f"[PERFORMANCE] Similarity Search: {search_time:.2f}ms")
-    return {"docs": docs, "performance": {**state.get("performance", {}), "similarity_search_ms": search_time}}
+    if "keyword_search_ms" in timings:
+        performance_monitor.metrics.setdefault("keyword_search", []).append(timings["keyword_search_ms"])
+    print(f"[PERFORMANCE] Similarity Search: {search_time:.2f}ms "
+          f"({', '.join(f'{name} {ms:.2f}ms' for name, ms in timings.items())})")
+    return {"docs": docs, "query_embedding": query_embedding,
+            "performance": {**state.get("performance", {}), "similarity_search_ms": search_time, **timings}}
 
-def llm_inference_node(state: ChatState):
+def retrieved_chunk_ids(docs):
+    return [doc.id or doc.page_content for doc in docs]
+
+async def answer_cache_node(state: ChatState):
+    """
+    Answer from the session's answer cache when the same or a near-identical question was answered
+    against the same index version and the retrieval returned the same chunks; otherwise fall
+    through to the LLM (see answer_cache_route). Follow-up questions that refer back to earlier
+    turns ("and the second one?") bypass the cache in both directions.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return {"cached": False}
+    start_time = time.time()
+    session_id = state.get("session_id", "")
+    query = state.get("query", "")
+    if state.get("messages") and depends_on_context(query):
+        performance_monitor.increment("answer_cache_bypassed")
+        return {"cached": False, "cacheable": False,
+                "performance": {**state.get("performance", {}), "answer_cache": "bypass"}}
+    entry, status = get_answer_cache().lookup(
+        session_id, getattr(state.get("vector_store"), "index_version", None), query,
+        state.get("query_embedding"), retrieved_chunk_ids(state.get("docs", []))
+    )
+    lookup_time = (time.time() - start_time) * 1000
+    performance_monitor.metrics.setdefault("answer_cache_lookup", []).append(lookup_time)
+    print(f"[PERFORMANCE] Answer Cache Lookup: {lookup_time:.2f}ms ({status})")
+    performance = {**state.get("performance", {}), "answer_cache": status, "answer_cache_lookup_ms": lookup_time}
+    if entry is None:
+        return {"cached": False, "cacheable": True, "performance": performance}
+
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    save_history(session_id, query, entry.answer, entry.model_name, timestamp, "N/A")
+    return {"cached": True, "answer": entry.answer, "timestamp": timestamp, "performance": performance}
+
+def answer_cache_route(state: ChatState) -> str:
+    return "hit" if state.get("cached") else "miss"
+
+def cache_answer(state: ChatState, answer, model_name):
+    """Keep a generated answer for repeats of the question against the same index version and chunks."""
+    if not ANSWER_CACHE_ENABLED or not state.get("cacheable"):
+        return
+    get_answer_cache().store(
+        state.get("session_id", ""), getattr(state.get("vector_store"), "index_version", None), state.get("query", ""),
+        state["query_embedding"], retrieved_chunk_ids(state.get("docs", [])), answer, model_name
+    )
+
+async def llm_inference_node(state: ChatState):
     docs = state.get("docs")
     query = state.get("query", "")
     session_id = state.get("session_id", "")
     messages = state.get("messages", [])
 
-    # Build context from conversation history
-    context = build_context_from_history(messages, query)
+    # Build context from the conversation summary and the latest turns
+    context, verbatim_turns = build_context_from_history(messages, query, get_summary(session_id))
     
-    start_time = time.time()
+    chain_start_time = time.time()
     chain = get_chain(context_type="local")  # Use "local" for local context
+    chain_construction_time = (time.time() - chain_start_time) * 1000
+
+    start_time = time.time()
     
-    # Pass the built context to the chain
-    response = chain({
+    # Pass the built context to the chain; the answer is streamed so /chat/stream can
+    # forward tokens as they arrive (see stream_chat_workflow)
+    parts = []
+    first_token_time = None
+    async for text in chain.astream({
         "input_documents": docs, 
         "question": query, 
         "context": context
-    }, return_only_outputs=True)
+    }):
+        if first_token_time is None:
+            first_token_time = (time.time() - start_time) * 1000
+        parts.append(text)
     
     llm_time = (time.time() - start_time) * 1000
     performance_monitor.metrics["llm_inference"].append(llm_time)
-    print(f"[PERFORMANCE] LLM Inference: {llm_time:.2f}ms")
+    print(f"[PERFORMANCE] LLM Inference: {llm_time:.2f}ms (first token after {first_token_time or 0:.2f}ms)")
     
-    answer = response['output_text']
+    answer = "".join(parts)
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     pdf_names = "N/A"
     
     # Save the current conversation to history
     save_history(session_id, query, answer, "Google AI", timestamp, pdf_names)
+    # Answers sent on to the web search are cached by tavily_call_func instead
+    if not answer.startswith("Error generating response") and web_call_func({"answer": answer}) == "end":
+        cache_answer(state, answer, "Google AI")
     
     return {
         "answer": answer,
         "timestamp": timestamp,
-        "performance": {**state.get("performance", {}), "llm_inference_ms": llm_time}
+        "performance": {**state.get("performance", {}), "context_tokens": estimate_tokens(context),
+                        "context_verbatim_turns": verbatim_turns,
+                        "chain_construction_ms": chain_construction_time,
+                        "llm_first_token_ms": first_token_time, "llm_inference_ms": llm_time}
     }
 
-def build_context_from_history(messages, current_query):
-    """
-    Build context string from conversation history.
-    messages: list of dicts with 'question' and 'answer' keys
-    current_query: the current user question
-    """
-    context = ""
-    
-    # Add previous conversations
-    for msg in messages:
-        if isinstance(msg, dict) and 'question' in msg and 'answer' in msg:
-            context += f"User: {msg['question']}\nAssistant: {msg['answer']}\n\n"
-    
-    # Add current query
-    context += f"User: {current_query}\nAssistant: "
-    
-    return context
-
 def web_call_func(state: ChatState) -> str:
     answer = state.get("answer", "").lower()
     
@@ -106,20 +167,21 @@ def web_call_func(state: ChatState) -> str:
     else:
         return "end"
 
-from tavily import TavilyClient
 from langchain.schema import Document
 
-def tavily_call_func(state: ChatState) -> ChatState:
+async def tavily_call_func(state: ChatState) -> ChatState:
     query = state.get("query", "")
     session_id = state.get("session_id", "")
     
     try:
-        # Create Tavily search tool
-        tavily = TavilyClient(TAVILY_API_KEY)
+        # Shared Tavily search client
+        tavily = get_tavily_client()
         print(f"[TAVILY] Searching for: {query}")
         
         # Use Tavily to search the web
-        results = tavily.search(query,exclude_domains=["https://en.wikipedia.org/wiki/"],max_results=3)
+        results = await asyncio.to_thread(
+            tavily.search, query, exclude_domains=["https://en.wikipedia.org/wiki/"], max_results=3
+        )
         print(f"[TAVILY] Search results: {results}")
         
         docs = []
@@ -132,13 +194,15 @@ def tavily_call_func(state: ChatState) -> ChatState:
             # Call the LLM with all web docs as input_documents
             chain = get_chain(context_type="web")
             # Use conversation history as context
-            context = build_context_from_history(state.get("messages", []), query)
-            response = chain({
+            context, _ = build_context_from_history(state.get("messages", []), query, get_summary(session_id))
+            response = await chain.ainvoke({
                 "input_documents": docs,
                 "question": query,
                 "context": context
             }, return_only_outputs=True)
             answer = response['output_text']
+            if not answer.startswith("Error generating response"):
+                cache_answer(state, answer, "Tavily Web Search")
         else:
             answer = "No relevant information found from web search."
             
@@ -161,12 +225,17 @@ def tavily_call_func(state: ChatState) -> ChatState:
 chat_graph = StateGraph(ChatState)
 chat_graph.add_node("load_vector_store", load_vector_store_node)
 chat_graph.add_node("similarity_search", similarity_search_node)
+chat_graph.add_node("answer_cache", answer_cache_node)
 chat_graph.add_node("llm_inference", llm_inference_node)
 chat_graph.add_node("tavily", tavily_call_func)
 
 chat_graph.set_entry_point("load_vector_store")
 chat_graph.add_edge("load_vector_store", "similarity_search")
-chat_graph.add_edge("similarity_search", "llm_inference")
+chat_graph.add_edge("similarity_search", "answer_cache")
+chat_graph.add_conditional_edges("answer_cache", answer_cache_route, {
+    "hit": END,
+    "miss": "llm_inference"
+})
 chat_graph.add_conditional_edges("llm_inference", web_call_func, {
     "search": "tavily",
     "end": END
@@ -176,7 +245,38 @@ compiled_chat_graph = chat_graph.compile()
 
 async def run_chat_workflow_async(state: ChatState):
     """Async run for the chat workflow."""
-    return await compiled_chat_graph.ainvoke(state)
+    result = await compiled_chat_graph.ainvoke(state)
+    schedule_summary_update(state.get("session_id", ""))
+    return result
+
+async def stream_chat_workflow(state: ChatState):
+    """
+    Run the chat workflow, yielding (event, data) pairs as it progresses:
+    ("docs", retrieved documents) once the search is done, ("token", text) for each piece of the
+    answer as the LLM generates it (a cached answer comes as a single token), ("restart", node) when a later node (the web search) starts a
+    new answer, and finally ("done", final state).
+    """
+    result = dict(state)
+    answering_node = None
+    async for mode, chunk in compiled_chat_graph.astream(state, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if answering_node is not None and node != answering_node:
+                yield "restart", node
+            answering_node = node
+            if message.content:
+                yield "token", message.content
+        else:
+            for node, update in chunk.items():
+                result.update(update or {})
+                if node == "similarity_search":
+                    yield "docs", update.get("docs", [])
+                elif node == "answer_cache" and update.get("cached"):
+                    yield "token", update["answer"]
+    # Scheduled outside the graph run, so the summary's LLM call is not streamed as answer tokens
+    schedule_summary_update(state.get("session_id", ""))
+    yield "done", result
 
 def visualize_workflow_mermaid():
     """Return the Mermaid syntax for the workflow graph for visualization."""
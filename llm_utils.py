@@ -1,10 +1,75 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
 from pydantic import SecretStr
-from config import GOOGLE_API_KEY
+from tavily import TavilyClient
+from config import GOOGLE_API_KEY, TAVILY_API_KEY, LLM_MODEL, LLM_TEMPERATURE
+from performance_monitor import performance_monitor
+import threading
+import time
 
-def get_chain(context_type="local"):# ... existing code ...
+_chat_models = {}
+_chains = {}
+_clients_lock = threading.Lock()
+_tavily_client = None
+
+def get_chain(context_type="local", model_name=LLM_MODEL, temperature=LLM_TEMPERATURE):
+    """
+    Return the shared chain for (context_type, model, temperature), building it on first use.
+    Chains hold no per-request state, so concurrent requests share them and their model client
+    (with its open connections). The time spent here is recorded as the chain_construction metric.
+    """
+    start_time = time.time()
+    key = (context_type, model_name, temperature)
+    with _clients_lock:
+        chain = _chains.get(key)
+        if chain is None:
+            chain = _chains[key] = build_chain(context_type, model_name, temperature)
+            performance_monitor.increment("llm_chain_builds")
+        else:
+            performance_monitor.increment("llm_chain_reuses")
+    performance_monitor.metrics.setdefault("chain_construction", []).append((time.time() - start_time) * 1000)
+    return chain
+
+def get_chat_model(model_name=LLM_MODEL, temperature=LLM_TEMPERATURE):
+    """Shared chat model client per (model, temperature); call with _clients_lock held."""
+    model = _chat_models.get((model_name, temperature))
+    if model is None:
+        model = _chat_models[(model_name, temperature)] = ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=temperature,
+            google_api_key=SecretStr(GOOGLE_API_KEY)
+        )
+    return model
+
+def get_tavily_client():
+    """Return the process-wide Tavily client; its requests session keeps connections alive between searches."""
+    global _tavily_client
+    with _clients_lock:
+        if _tavily_client is None:
+            _tavily_client = TavilyClient(TAVILY_API_KEY)
+    return _tavily_client
+
+SUMMARY_PROMPT = """
+Update the running summary of a conversation between a user and an assistant about their documents.
+Keep the facts, figures, names and source references a later question could depend on; drop pleasantries.
+Write at most {max_words} words.
+
+**Current Summary:**
+{summary}
+
+**New Turns:**
+{turns}
+
+**Updated Summary:**
+"""
+
+async def summarize_conversation(summary, turns, max_words, model_name=LLM_MODEL, temperature=LLM_TEMPERATURE):
+    """Fold conversation turns (formatted text) into the running summary; returns the new summary."""
+    with _clients_lock:
+        model = get_chat_model(model_name, temperature)
+    prompt = SUMMARY_PROMPT.format(max_words=max_words, summary=summary or "(none)", turns=turns)
+    return (await model.ainvoke(prompt)).content.strip()
+
+def build_chain(context_type, model_name, temperature):
 
     if context_type == "web":
         prompt_template = """
@@ -46,20 +111,24 @@ You are an intelligent assistant with access to document content and conversatio
 
 **Your Response:**
 """
-# ... rest of get_chain() ...
-    
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-exp", 
-        temperature=0.3, 
-        google_api_key=SecretStr(GOOGLE_API_KEY)
-    )
-    
-    prompt = PromptTemplate(
-        template=prompt_template, 
-        input_variables=["context", "question"]
-    )
-    
-    def chain(inputs, return_only_outputs=False):
+
+    model = get_chat_model(model_name, temperature)
+    return QAChain(model, prompt_template)
+
+
+class QAChain:
+    """
+    Question answering over documents: the documents and conversation are formatted into the
+    prompt and sent to the model. Call it for a blocking answer, await ainvoke() from async
+    code so a slow LLM call does not hold up the event loop, or iterate astream() for the
+    answer text as the model generates it.
+    """
+
+    def __init__(self, model, prompt_template):
+        self.model = model
+        self.prompt_template = prompt_template
+
+    def format_prompt(self, inputs):
         # Extract document context from input_documents
         doc_context = ""
         if "input_documents" in inputs and inputs["input_documents"]:
@@ -69,20 +138,38 @@ You are an intelligent assistant with access to document content and conversatio
             ])
         # Get conversation context and current question
         conversation_context = inputs.get("context", "")
-        current_question = inputs.get("question", "")
         # Format the final prompt
-        formatted_prompt = prompt_template.format(
+        formatted_prompt = self.prompt_template.format(
             context=doc_context,
             question=conversation_context
         )
-        print(f"[DEBUG] Formatted prompt: {formatted_prompt[:500]}...")
+        return formatted_prompt
+
+    def __call__(self, inputs, return_only_outputs=False):
+        formatted_prompt = self.format_prompt(inputs)
         # Call the LLM
         try:
-            output_text = model.predict(formatted_prompt)
-            print(f"[DEBUG] LLM response: {output_text}...")
+            output_text = self.model.predict(formatted_prompt)
             return {"output_text": output_text}
         except Exception as e:
             print(f"[ERROR] LLM call failed: {e}")
             return {"output_text": f"Error generating response: {str(e)}"}
-    
-    return chain
\ No newline at end of file
+
+    async def ainvoke(self, inputs, return_only_outputs=False):
+        formatted_prompt = self.format_prompt(inputs)
+        try:
+            output_text = (await self.model.ainvoke(formatted_prompt)).content
+            return {"output_text": output_text}
+        except Exception as e:
+            print(f"[ERROR] LLM call failed: {e}")
+            return {"output_text": f"Error generating response: {str(e)}"}
+
+    async def astream(self, inputs):
+        formatted_prompt = self.format_prompt(inputs)
+        try:
+            async for chunk in self.model.astream(formatted_prompt):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            print(f"[ERROR] LLM call failed: {e}")
+            yield f"Error generating response: {str(e)}"
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import pytesseract
+
+from config import OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_LANG, OCR_TESSERACT_CONFIG
+from ocr_preprocess import preprocess_settings_fingerprint
+from ocr_triage import triage_settings_fingerprint
+from performance_monitor import performance_monitor
+
+
+@lru_cache(maxsize=1)
+def ocr_settings_fingerprint():
+    """Everything besides the image bytes that changes what Tesseract returns."""
+    try:
+        version = str(pytesseract.get_tesseract_version())
+    except Exception:
+        version = "unknown"
+    return f"tesseract={version}|lang={OCR_LANG}|config={OCR_TESSERACT_CONFIG}|{triage_settings_fingerprint()}|{preprocess_settings_fingerprint()}"
+
+
+def ocr_cache_key(img_bytes):
+    """Content hash of the image plus the OCR settings."""
+    digest = hashlib.sha256(img_bytes)
+    digest.update(ocr_settings_fingerprint().encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """
+    Persistent OCR result cache.
+    Each entry is one pickle file holding (sorted_df, width, height) for an image,
+    named by its cache key. Entries are evicted least-recently-used first once
+    the directory grows past `max_bytes`; file mtimes carry recency across restarts.
+    """
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key):
+        """Return the cached (sorted_df, width, height) or None."""
+        with self._lock:
+            if key not in self._entries:
+                performance_monitor.increment("ocr_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                result = pickle.load(f)
+            os.utime(self._path(key))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Evicted by another process or a torn write; treat as a miss
+            self._forget(key)
+            performance_monitor.increment("ocr_cache_misses")
+            return None
+        performance_monitor.increment("ocr_cache_hits")
+        return result
+
+    def put(self, key, result):
+        """Store an OCR result and evict old entries past the size cap."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+        if evicted:
+            performance_monitor.increment("ocr_cache_evictions", len(evicted))
+
+    def _forget(self, key):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+
+
+_ocr_cache = None
+
+
+def get_ocr_cache():
+    """Return the process-wide OCR cache."""
+    global _ocr_cache
+    if _ocr_cache is None:
+        _ocr_cache = OcrCache()
+    return _ocr_cache
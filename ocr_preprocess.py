@@ -0,0 +1,170 @@
+import io
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from config import (
+    OCR_PREPROCESS_ENABLED, OCR_TARGET_LINE_HEIGHT_PX, OCR_PREPROCESS_MIN_SCALE, OCR_PREPROCESS_MAX_SCALE,
+    OCR_PREPROCESS_BINARIZE, OCR_PREPROCESS_MAX_SKEW_DEG,
+)
+from ocr_triage import otsu_threshold
+
+# Longer side of the grayscale probe that skew and line height are measured on
+PROBE_SIZE = 1600
+# Longer side of the ink mask the skew search runs on
+SKEW_PROBE_SIZE = 800
+# Resampling closer to 1.0 than this is not worth the work
+SCALE_TOLERANCE = 0.2
+# Skew below this (degrees) is left alone
+MIN_SKEW_DEG = 0.3
+
+# How the OCR input was derived from the original image: resized by `scale`,
+# then rotated by `angle` degrees (counter-clockwise) about the centre of the resized image
+OcrTransform = namedtuple("OcrTransform", ["scale", "angle", "size"])
+
+
+def preprocess_settings_fingerprint():
+    """Preprocessing settings that change OCR output, for the OCR cache key."""
+    return (f"preprocess={OCR_PREPROCESS_ENABLED}|line_height={OCR_TARGET_LINE_HEIGHT_PX}"
+            f"|scale={OCR_PREPROCESS_MIN_SCALE}-{OCR_PREPROCESS_MAX_SCALE}"
+            f"|binarize={OCR_PREPROCESS_BINARIZE}|skew={OCR_PREPROCESS_MAX_SKEW_DEG}")
+
+
+def ink_mask(gray):
+    """Otsu-binarized ink pixels (the minority class, so light-on-dark text works too)."""
+    ink = gray <= otsu_threshold(gray)
+    return ~ink if ink.mean() > 0.5 else ink
+
+
+def estimate_skew(ink, max_deg=OCR_PREPROCESS_MAX_SKEW_DEG):
+    """
+    Skew angle (degrees) that makes text lines horizontal.
+    Rotating the ink mask so lines are level makes its row profile most peaked,
+    so the angle with the largest row-sum variance wins. Searched in 1 degree steps
+    on a small mask, then refined in 0.25 degree steps around the best one.
+    """
+    if max_deg <= 0 or not ink.any():
+        return 0.0
+    mask = Image.fromarray(ink.astype(np.uint8) * 255)
+    mask.thumbnail((SKEW_PROBE_SIZE, SKEW_PROBE_SIZE), resample=Image.BOX)
+
+    def profile_variance(angle):
+        rotated = np.asarray(mask.rotate(float(angle), resample=Image.BILINEAR), dtype=float)
+        return rotated.sum(axis=1).var()
+
+    best_angle = max(np.arange(-max_deg, max_deg + 0.5, 1.0), key=profile_variance)
+    best_angle = max(np.arange(best_angle - 0.75, best_angle + 0.8, 0.25), key=profile_variance)
+    best_angle = float(np.clip(best_angle, -max_deg, max_deg))
+    return best_angle if abs(best_angle) >= MIN_SKEW_DEG else 0.0
+
+
+def estimate_line_height(ink):
+    """
+    Median height in pixels of the text lines in an ink mask, or None when there is no line structure.
+    Lines are runs of consecutive rows holding ink, separated by empty rows.
+    """
+    rows = ink.mean(axis=1) > 0.002
+    if not rows.any():
+        return None
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+    heights = edges[1::2] - edges[::2]
+    heights = heights[heights >= 3]
+    # A single run spanning most of the image is a picture, not lines of text
+    if heights.size == 0 or (heights.size == 1 and heights[0] > 0.5 * ink.shape[0]):
+        return None
+    return float(np.median(heights))
+
+
+def plan_ocr_transform(img):
+    """
+    Measure an image and decide how to prepare it for Tesseract.
+    Returns (scale, angle): the resampling factor that brings the median text line to
+    OCR_TARGET_LINE_HEIGHT_PX (clamped to the configured range) and the deskew angle.
+    """
+    probe = img.convert("L")
+    probe_scale = min(1.0, PROBE_SIZE / max(img.size))
+    if probe_scale < 1.0:
+        probe = probe.resize((max(1, round(img.width * probe_scale)), max(1, round(img.height * probe_scale))))
+    ink = ink_mask(np.asarray(probe))
+    angle = estimate_skew(ink)
+    if angle:
+        ink = np.asarray(Image.fromarray(ink.astype(np.uint8) * 255).rotate(angle, resample=Image.NEAREST)) > 0
+
+    scale = 1.0
+    line_height = estimate_line_height(ink)
+    if line_height:
+        scale = OCR_TARGET_LINE_HEIGHT_PX / (line_height / probe_scale)
+        scale = min(OCR_PREPROCESS_MAX_SCALE, max(OCR_PREPROCESS_MIN_SCALE, scale))
+        if abs(scale - 1.0) < SCALE_TOLERANCE:
+            scale = 1.0
+    return scale, angle
+
+
+def preprocess_for_ocr(img, scale=1.0):
+    """
+    Prepare a PIL image for Tesseract: resample so text lines are about OCR_TARGET_LINE_HEIGHT_PX
+    tall, deskew, and convert to grayscale (binarized with Otsu if OCR_PREPROCESS_BINARIZE).
+    `scale` is an extra factor on top of the planned resampling (the timeout retry ladder).
+    Returns (ocr_input, OcrTransform) for restore_ocr_boxes.
+    """
+    plan_scale, angle = plan_ocr_transform(img) if OCR_PREPROCESS_ENABLED else (1.0, 0.0)
+    scale *= plan_scale
+    out = img.convert("L")
+    if scale != 1.0:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        # Upscaled images are small, so the sharper filter is cheap; big scans are reduced fast
+        out = out.resize(size, Image.LANCZOS) if scale > 1.0 else out.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    if angle:
+        out = out.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+    if OCR_PREPROCESS_ENABLED and OCR_PREPROCESS_BINARIZE:
+        gray = np.asarray(out)
+        threshold = otsu_threshold(gray)
+        out = Image.fromarray(np.where(gray > threshold, 255, 0).astype(np.uint8))
+    return out, OcrTransform(scale, angle, out.size)
+
+
+def restore_ocr_boxes(sorted_df, transform, original_size):
+    """
+    Map word boxes from the preprocessed image back to original pixel coordinates.
+    Rotated boxes become the axis-aligned box around their four corners, clipped to the image.
+    """
+    scale, angle, (width, height) = transform
+    if (scale == 1.0 and not angle) or sorted_df.empty:
+        return sorted_df
+    sorted_df = sorted_df.copy()
+    left = sorted_df["left"].to_numpy(dtype=float)
+    top = sorted_df["top"].to_numpy(dtype=float)
+    right = left + sorted_df["width"].to_numpy(dtype=float)
+    bottom = top + sorted_df["height"].to_numpy(dtype=float)
+
+    xs = np.stack([left, right, right, left], axis=1)
+    ys = np.stack([top, top, bottom, bottom], axis=1)
+    if angle:
+        # PIL rotates counter-clockwise about the centre; undo it (image y points down)
+        cx, cy = width / 2, height / 2
+        theta = np.deg2rad(angle)
+        cos, sin = np.cos(theta), np.sin(theta)
+        dx, dy = xs - cx, ys - cy
+        xs, ys = cx + dx * cos - dy * sin, cy + dx * sin + dy * cos
+    xs, ys = xs / scale, ys / scale
+
+    x0 = np.clip(xs.min(axis=1), 0, original_size[0])
+    y0 = np.clip(ys.min(axis=1), 0, original_size[1])
+    x1 = np.clip(xs.max(axis=1), 0, original_size[0])
+    y1 = np.clip(ys.max(axis=1), 0, original_size[1])
+    sorted_df["left"] = np.round(x0).astype(int)
+    sorted_df["top"] = np.round(y0).astype(int)
+    sorted_df["width"] = np.round(x1 - x0).astype(int)
+    sorted_df["height"] = np.round(y1 - y0).astype(int)
+    return sorted_df.sort_values(by=["top", "left"], ascending=True)
+
+
+def preprocess_image_bytes(img_bytes, scale=1.0):
+    """preprocess_for_ocr for encoded bytes; returns (png_bytes, OcrTransform, original_size)."""
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        ocr_input, transform = preprocess_for_ocr(img, scale)
+        original_size = img.size
+    buf = io.BytesIO()
+    ocr_input.save(buf, format="PNG")
+    return buf.getvalue(), transform, original_size
@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from config import (
+    OCR_TRIAGE_MIN_SIDE, OCR_TRIAGE_MIN_AREA, OCR_TRIAGE_MIN_ENTROPY,
+    OCR_TRIAGE_MIN_EDGE_DENSITY, OCR_TRIAGE_MIN_TEXT_SCORE, OCR_TRIAGE_MAX_SIDE, OCR_TRIAGE_ENABLED,
+)
+
+# Side length of the grayscale thumbnail the statistics are computed on
+PROBE_SIZE = 512
+
+
+def triage_settings_fingerprint():
+    """Triage settings that change OCR output (downscaling), for the OCR cache key."""
+    return f"triage={OCR_TRIAGE_ENABLED}|triage_max_side={OCR_TRIAGE_MAX_SIDE}"
+
+
+def otsu_threshold(gray):
+    """Otsu's threshold for a uint8 grayscale array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(float)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    between_var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between_var))
+
+
+def image_statistics(gray):
+    """
+    Cheap statistics of a grayscale thumbnail:
+    - entropy: Shannon entropy of the intensity histogram (bits); near 0 for flat fills
+    - edge_density: fraction of pixels on a strong intensity gradient
+    - text_score: how much the ink looks like thin strokes laid out in lines. Text ink is
+      mostly edge pixels and leaves empty rows between lines; photos and shapes are solid blobs.
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(float)
+    probs = hist[hist > 0] / hist.sum()
+    entropy = float(-(probs * np.log2(probs)).sum())
+
+    values = gray.astype(np.int16)
+    grad_x = np.abs(np.diff(values, axis=1))[:-1, :]
+    grad_y = np.abs(np.diff(values, axis=0))[:, :-1]
+    edges = (grad_x + grad_y) > 64
+    edge_density = float(edges.mean()) if edges.size else 0.0
+
+    # Ink is the darker Otsu class, or the lighter one for light-on-dark images
+    ink = gray <= otsu_threshold(gray)
+    if ink.mean() > 0.5:
+        ink = ~ink
+    ink_pixels = ink[:-1, :-1].sum()
+    if ink_pixels == 0:
+        return entropy, edge_density, 0.0
+    stroke_ratio = float((edges & ink[:-1, :-1]).sum() / ink_pixels)
+    rows_with_ink = ink.mean(axis=1) > 0.005
+    line_gaps = 0.05 <= 1 - rows_with_ink.mean() <= 0.95
+    text_score = stroke_ratio if line_gaps else stroke_ratio / 2
+    return entropy, edge_density, text_score
+
+
+def triage_image(img_bytes):
+    """
+    Decide whether an embedded image is worth sending to Tesseract.
+    Returns (decision, reason, img_bytes, scale):
+      ("skip", reason, None, None) for icons, bullets, separators and pictures without text;
+      ("downscale", reason, resized_png_bytes, scale) when the longer side exceeds OCR_TRIAGE_MAX_SIDE,
+      where OCR coordinates must be divided by `scale` to get back to the original image;
+      ("ocr", None, img_bytes, 1.0) otherwise.
+    """
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        width, height = img.size
+        if min(width, height) < OCR_TRIAGE_MIN_SIDE or width * height < OCR_TRIAGE_MIN_AREA:
+            return "skip", "too_small", None, None
+
+        probe = img.convert("L")
+        probe.thumbnail((PROBE_SIZE, PROBE_SIZE))
+        entropy, edge_density, text_score = image_statistics(np.asarray(probe))
+        if entropy < OCR_TRIAGE_MIN_ENTROPY:
+            return "skip", "flat", None, None
+        if edge_density < OCR_TRIAGE_MIN_EDGE_DENSITY:
+            return "skip", "no_edges", None, None
+        if text_score < OCR_TRIAGE_MIN_TEXT_SCORE:
+            return "skip", "no_text_pattern", None, None
+
+        if max(width, height) > OCR_TRIAGE_MAX_SIDE:
+            scale = OCR_TRIAGE_MAX_SIDE / max(width, height)
+            resized = img.convert("RGB").resize((round(width * scale), round(height * scale)), Image.LANCZOS)
+            buf = io.BytesIO()
+            resized.save(buf, format="PNG")
+            return "downscale", "too_large", buf.getvalue(), scale
+    return "ocr", None, img_bytes, 1.0
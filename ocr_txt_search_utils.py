@@ -1,27 +1,203 @@
-import os
 import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import pandas as pd
+
+TEXT_INDEX_FILE = "text_index.sqlite"
+
+# One row per text line; the FTS5 table indexes token positions, so phrases match in order
+TEXT_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,  -- image file, or PDF file for born-digital pages
+    page_number INTEGER,  -- PDF page of a born-digital line, NULL for OCRed images
+    line INTEGER NOT NULL,  -- 1-based line number within the image or page
+    text TEXT NOT NULL,  -- the line's words joined by single spaces
+    boxes TEXT NOT NULL  -- JSON [x_min, y_min, x_max, y_max] per word
+);
+CREATE INDEX IF NOT EXISTS lines_source ON lines (source, page_number);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(
+    text, content='lines', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS lines_ai AFTER INSERT ON lines BEGIN
+    INSERT INTO lines_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS lines_ad AFTER DELETE ON lines BEGIN
+    INSERT INTO lines_fts(lines_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+_text_indexes = {}
+_text_indexes_lock = threading.Lock()
+
+
+def tokens(text):
+    """Words of text as the FTS5 unicode61 tokenizer sees them: case-folded, without diacritics."""
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return re.findall(r"\w+", text.casefold())
+
+
+def parse_query(query):
+    """
+    Split a query into phrases (lists of tokens): "double-quoted" parts are one phrase each,
+    and every other word is a phrase of its own tokens, so "XJ-4471" stays a phrase.
+    """
+    phrases = []
+    for quoted, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        phrase = tokens(quoted or word)
+        if phrase and phrase not in phrases:
+            phrases.append(phrase)
+    return phrases
+
+
+def group_lines(words_df):
+    """
+    Group words into text lines: consecutive words whose vertical centre falls inside the
+    current line's band belong to it. Works for Tesseract output sorted top-to-bottom and for
+    PyMuPDF reading order. Returns lists of (text, [x_min, y_min, x_max, y_max]), left to right.
+    """
+    lines = []
+    band = None
+    texts = words_df["text"].astype(str).tolist()
+    coords = words_df[["left", "top", "width", "height"]].to_numpy(dtype=float).tolist()
+    for text, (left, top, width, height) in zip(texts, coords):
+        box = [int(left), int(top), int(left + width), int(top + height)]
+        centre = top + height / 2
+        if band is None or not band[0] <= centre <= band[1]:
+            lines.append([])
+            band = (top, top + height)
+        lines[-1].append((text, box))
+    return [sorted(line, key=lambda word: word[1][0]) for line in lines]
+
+
+def match_box(words, phrases):
+    """Bounding box of the words of a line that match the query phrases (the whole line if none do)."""
+    # Flatten to one entry per token, remembering the word it came from
+    token_words = [(token, i) for i, (text, _) in enumerate(words) for token in tokens(text)]
+    stream = [token for token, _ in token_words]
+    matched = set()
+    for phrase in phrases:
+        for start in range(len(stream) - len(phrase) + 1):
+            if stream[start:start + len(phrase)] == phrase:
+                matched.update(i for _, i in token_words[start:start + len(phrase)])
+    boxes = [box for i, (_, box) in enumerate(words) if i in matched or not matched]
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+class TextIndex:
+    """
+    Positional full-text index over the OCR and text-layer words of one session directory,
+    stored in SQLite FTS5 next to the page images. Lines are added as pages are ingested, so
+    exact-text lookups never rescan the text files.
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, TEXT_INDEX_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(TEXT_INDEX_SCHEMA)
+
+    def add_words(self, source, page_number, words_df):
+        """Index the words of an image or PDF page, replacing what was indexed for it before."""
+        rows = []
+        for line_number, words in enumerate(group_lines(words_df), start=1):
+            text = " ".join(word for word, _ in words)
+            rows.append((source, page_number, line_number, text, json.dumps([box for _, box in words])))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM lines WHERE source = ? AND page_number IS ?", (source, page_number))
+            self._conn.executemany(
+                "INSERT INTO lines (source, page_number, line, text, boxes) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def search(self, query, limit=20):
+        """
+        Lines containing every phrase of the query, best BM25 match first.
+        Returns dicts with source, page_number, line, text and the bbox of the matching words.
+        """
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        match = " AND ".join('"' + " ".join(phrase) + '"' for phrase in phrases)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT l.source, l.page_number, l.line, l.text, l.boxes FROM lines_fts "
+                "JOIN lines l ON l.id = lines_fts.rowid WHERE lines_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        results = []
+        for source, page_number, line, text, boxes in rows:
+            words = list(zip(text.split(" "), json.loads(boxes)))
+            results.append({
+                "source": source,
+                "page_number": page_number,
+                "line": line,
+                "text": text,
+                "bbox": match_box(words, phrases),
+            })
+        return results
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def index_coordinate_files(text_index, output_dir):
+    """Index the *_coordinates.txt files of a session processed before the text index existed."""
+    for txt_file in glob.glob(os.path.join(output_dir, "*_coordinates.txt")):
+        stem = txt_file[:-len("_coordinates.txt")]
+        images = [path for path in glob.glob(glob.escape(stem) + ".*") if not path.endswith(".txt")]
+        source = os.path.basename(images[0] if images else stem)
+        words_df = pd.read_csv(txt_file, sep="\t", dtype={"text": str}, keep_default_na=False)
+        text_index.add_words(source, None, words_df[words_df.text.str.strip() != ""])
+
+
+def get_text_index(output_dir):
+    """Return the text index of a session output directory, creating it on first use."""
+    with _text_indexes_lock:
+        text_index = _text_indexes.get(output_dir)
+        if text_index is None:
+            os.makedirs(output_dir, exist_ok=True)
+            is_new = not os.path.exists(os.path.join(output_dir, TEXT_INDEX_FILE))
+            text_index = TextIndex(output_dir)
+            if is_new:
+                index_coordinate_files(text_index, output_dir)
+            _text_indexes[output_dir] = text_index
+    return text_index
+
+
+def close_text_index(output_dir, delete=False):
+    """Close the cached text index of a session output directory; with `delete`, also remove its files."""
+    with _text_indexes_lock:
+        text_index = _text_indexes.pop(output_dir, None)
+        if text_index is not None:
+            text_index.close()
+        if delete:
+            path = os.path.join(output_dir, TEXT_INDEX_FILE)
+            for index_file in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(index_file):
+                    os.remove(index_file)
+
 
 def answer_from_txt_files(query, output_dir="pdf_output/default"):
     """
-    Search all .txt files in the output directory for relevant snippets answering the query.
+    Search the session's OCR text for lines containing the query.
     Returns a string with the answer and references to the exact text snippets and filenames.
     """
-    txt_files = glob.glob(os.path.join(output_dir, "*.txt"))
-    best_snippets = []
-    query_lower = query.lower()
-    for txt_file in txt_files:
-        with open(txt_file, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Simple keyword search (can be replaced with embedding similarity)
-            if query_lower in content.lower():
-                # Find the exact snippet (e.g., sentence or paragraph)
-                for line in content.split('\n'):
-                    if query_lower in line.lower() and line.strip():
-                        best_snippets.append((txt_file, line.strip()))
-    if best_snippets:
+    start_time = time.time()
+    matches = get_text_index(output_dir).search(query)
+    print(f"[PERFORMANCE] Text index search: {(time.time() - start_time) * 1000:.2f}ms")
+    if matches:
         answer = "Based on the OCR text, here is what I found:\n"
-        for fname, snippet in best_snippets:
-            answer += f"\nFile: {os.path.basename(fname)}\nSnippet: \"{snippet}\"\n"
+        for match in matches:
+            answer += f"\nFile: {match['source']}\nSnippet: \"{match['text']}\"\n"
         return answer
     else:
-        return "No relevant information found in the OCR text files." 
\ No newline at end of file
+        return "No relevant information found in the OCR text files."
@@ -0,0 +1,363 @@
+import asyncio
+import csv
+import io
+import os
+import shlex
+import subprocess
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytesseract
+from PIL import Image
+from pytesseract import Output
+
+from config import (
+    OCR_MAX_WORKERS, OCR_MAX_IN_FLIGHT, OCR_LANG, OCR_TESSERACT_CONFIG,
+    OCR_BACKEND, OCR_BATCH_SIZE, OCR_BATCH_MAX_DELAY_MS, OCR_TRIAGE_ENABLED,
+    OCR_IMAGE_TIMEOUT_S, OCR_UPLOAD_TIMEOUT_S, OCR_TIMEOUT_RETRIES,
+)
+from ocr_cache import get_ocr_cache, ocr_cache_key
+from ocr_preprocess import preprocess_for_ocr, preprocess_image_bytes, restore_ocr_boxes
+from ocr_triage import triage_image
+from performance_monitor import performance_monitor
+
+_ocr_executor = None
+
+# Running average of Tesseract time per image, used to estimate the time triage saves
+_ocr_ms_per_image = None
+
+
+def get_ocr_executor():
+    """Return the process-wide OCR worker pool, creating it on first use."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        _ocr_executor = ProcessPoolExecutor(max_workers=max(1, OCR_MAX_WORKERS))
+    return _ocr_executor
+
+
+def clean_ocr_words(ocr_df):
+    """Drop empty detections and sort words top-to-bottom, left-to-right."""
+    ocr_df = ocr_df.dropna(subset=["text"]).copy()
+    ocr_df["text"] = ocr_df["text"].astype(str)
+    ocr_df = ocr_df[ocr_df.text.str.strip() != '']
+
+    # Sort words by their vertical and then horizontal position
+    return ocr_df.sort_values(by=['top', 'left'], ascending=True)
+
+
+def timed_call(func, *args):
+    """Run func in a worker and also return how long it took there, excluding queueing."""
+    start_time = time.time()
+    result = func(*args)
+    return result, (time.time() - start_time) * 1000
+
+
+def record_ocr_time(elapsed_ms, n_images=1):
+    global _ocr_ms_per_image
+    per_image = elapsed_ms / max(1, n_images)
+    if _ocr_ms_per_image is None:
+        _ocr_ms_per_image = per_image
+    else:
+        _ocr_ms_per_image = 0.9 * _ocr_ms_per_image + 0.1 * per_image
+
+
+def estimated_ocr_time_saved_ms(stats):
+    """Tesseract time avoided by triage, from the skipped count and the running per-image average."""
+    return stats["images_skipped"] * (_ocr_ms_per_image or 0.0)
+
+
+def image_size(img_bytes):
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        return img.size
+
+
+def empty_ocr_result(size):
+    """The OCR result of an image with no text: no words, original size."""
+    words_df = pd.DataFrame({
+        "text": pd.Series(dtype=object),
+        **{column: pd.Series(dtype=int) for column in ("left", "top", "width", "height")},
+    })
+    return words_df, size[0], size[1]
+
+
+def rescale_ocr_result(result, scale, original_size):
+    """Map word boxes from a resized image back to the original pixel coordinates."""
+    sorted_df, _, _ = result
+    if sorted_df.empty:
+        return sorted_df, original_size[0], original_size[1]
+    sorted_df = sorted_df.copy()
+    for column in ("left", "top", "width", "height"):
+        sorted_df[column] = (sorted_df[column] / scale).round().astype(int)
+    return sorted_df, original_size[0], original_size[1]
+
+
+def parse_retry_ladder(spec):
+    """Parse OCR_TIMEOUT_RETRIES into [(scale, tesseract_config), ...]."""
+    ladder = []
+    for step in spec.split(";"):
+        if step.strip():
+            scale, _, config = step.partition(":")
+            ladder.append((float(scale), config.strip()))
+    return ladder
+
+
+OCR_RETRY_LADDER = parse_retry_ladder(OCR_TIMEOUT_RETRIES)
+
+
+class OcrBudget:
+    """
+    Time budget for the OCR of one upload.
+    Each Tesseract attempt may run for at most OCR_IMAGE_TIMEOUT_S and nothing runs past
+    the upload deadline. Images that run out of time, or only succeed with a cheaper
+    retry setting, are recorded by name for the upload response.
+    """
+
+    def __init__(self, upload_timeout_s=OCR_UPLOAD_TIMEOUT_S, image_timeout_s=OCR_IMAGE_TIMEOUT_S):
+        self.deadline = time.time() + upload_timeout_s
+        self.image_timeout_s = image_timeout_s
+        self.timed_out = []
+        self.degraded = []
+
+    def expired(self):
+        return time.time() >= self.deadline
+
+    def record(self, name, outcome):
+        if outcome == "timeout":
+            self.timed_out.append(name)
+        elif outcome == "degraded":
+            self.degraded.append(name)
+
+    def to_dict(self):
+        return {"images_timed_out": list(self.timed_out), "images_degraded": list(self.degraded)}
+
+
+def ocr_image(img_bytes, scale=1.0, config=OCR_TESSERACT_CONFIG, timeout=0):
+    """
+    OCR a single encoded image with Tesseract.
+    Runs inside a worker process, so it only takes and returns picklable values.
+    The image is preprocessed first (see ocr_preprocess: resampled to a target text line height,
+    deskewed, binarized, with an extra `scale` factor on top) and boxes are mapped back to original pixels.
+    A non-zero `timeout` kills the tesseract process after that many seconds (RuntimeError).
+    Returns the recognised words sorted top-to-bottom, left-to-right, plus the image size.
+    """
+    img = Image.open(io.BytesIO(img_bytes))
+    ocr_input, transform = preprocess_for_ocr(img, scale)
+
+    # Use image_to_data to get detailed OCR output with coordinates
+    ocr_df = pytesseract.image_to_data(ocr_input, lang=OCR_LANG, config=config, timeout=timeout, output_type=Output.DATAFRAME)
+    return restore_ocr_boxes(clean_ocr_words(ocr_df), transform, img.size), img.width, img.height
+
+
+def ocr_image_with_budget(img_bytes, image_timeout_s, deadline):
+    """
+    OCR with a hard per-attempt timeout, walking down OCR_RETRY_LADDER when Tesseract runs out of time.
+    Returns (result, outcome) where outcome is "ok", "degraded" (a cheaper retry succeeded)
+    or "timeout" (no attempt finished in time; the result has no words).
+    """
+    attempts = [(1.0, OCR_TESSERACT_CONFIG)] + OCR_RETRY_LADDER
+    for level, (scale, config) in enumerate(attempts):
+        timeout = min(image_timeout_s, deadline - time.time())
+        if timeout <= 0:
+            break
+        try:
+            result = ocr_image(img_bytes, scale=scale, config=config, timeout=timeout)
+        except RuntimeError as e:
+            if "timeout" not in str(e).lower():
+                raise
+            print(f"[OCR] Tesseract timed out after {timeout:.1f}s (scale={scale}, config='{config}')")
+            continue
+        return result, "ok" if level == 0 else "degraded"
+    return empty_ocr_result(image_size(img_bytes)), "timeout"
+
+
+def ocr_image_batch(images_bytes, timeout=None):
+    """
+    OCR several encoded images with a single tesseract process.
+    The images are passed through a list file, so process start-up and language model
+    loading are paid once per batch; the TSV output numbers each input image as a page
+    and is split back into one word frame per image. Images are preprocessed like in ocr_image. The process is killed after `timeout`
+    seconds (subprocess.TimeoutExpired).
+    Returns a list of (sorted_df, width, height) in input order.
+    """
+    transforms = []
+    with tempfile.TemporaryDirectory(prefix="ocr_batch_") as tmp_dir:
+        image_paths = []
+        for i, img_bytes in enumerate(images_bytes):
+            ocr_bytes, transform, original_size = preprocess_image_bytes(img_bytes)
+            transforms.append((transform, original_size))
+            image_path = os.path.join(tmp_dir, f"{i:05d}.png")
+            with open(image_path, "wb") as f:
+                f.write(ocr_bytes)
+            image_paths.append(image_path)
+        list_path = os.path.join(tmp_dir, "images.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(image_paths) + "\n")
+
+        cmd = [pytesseract.pytesseract.tesseract_cmd, list_path, "stdout", "-l", OCR_LANG]
+        cmd += shlex.split(OCR_TESSERACT_CONFIG) + ["tsv"]
+        proc = subprocess.run(cmd, capture_output=True, check=True, timeout=timeout)
+
+    ocr_df = pd.read_csv(io.BytesIO(proc.stdout), sep="\t", quoting=csv.QUOTE_NONE)
+    results = []
+    for page_num, (transform, (width, height)) in enumerate(transforms, start=1):
+        page_df = ocr_df[ocr_df["page_num"] == page_num]
+        results.append((restore_ocr_boxes(clean_ocr_words(page_df), transform, (width, height)), width, height))
+    return results
+
+
+def ocr_image_batch_or_single(images_bytes, image_timeout_s, deadline):
+    """
+    Batch OCR under a budget of image_timeout_s per image (capped by the upload deadline).
+    If the batch is rejected (e.g. one unreadable image) or runs out of time, every image is
+    retried on its own with ocr_image_with_budget. Returns a list of (result, outcome).
+    """
+    timeout = min(image_timeout_s * len(images_bytes), deadline - time.time())
+    if timeout > 0:
+        try:
+            return [(result, "ok") for result in ocr_image_batch(images_bytes, timeout=timeout)]
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError, KeyError) as e:
+            print(f"[OCR] Batch of {len(images_bytes)} images failed ({e}); retrying one by one")
+    return [ocr_image_with_budget(img_bytes, image_timeout_s, deadline) for img_bytes in images_bytes]
+
+
+class TesseractBatcher:
+    """
+    Collects single-image OCR requests from the event loop into batches for ocr_image_batch.
+    A batch is sent to the worker pool when it reaches `batch_size` images or
+    `max_delay_ms` after its first image, whichever comes first.
+    """
+
+    def __init__(self, batch_size=OCR_BATCH_SIZE, max_delay_ms=OCR_BATCH_MAX_DELAY_MS):
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay_ms / 1000
+        self.loop = asyncio.get_running_loop()
+        self._pending = []
+        self._timer = None
+        self._tasks = set()  # dispatches in flight; the loop only keeps weak references to tasks
+
+    def submit(self, img_bytes, budget):
+        future = self.loop.create_future()
+        self._pending.append((img_bytes, budget, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        # Images from several uploads can share a batch; the tightest budget applies
+        image_timeout_s = min(budget.image_timeout_s for _, budget, _ in batch)
+        deadline = min(budget.deadline for _, budget, _ in batch)
+        try:
+            results, elapsed_ms = await asyncio.wrap_future(get_ocr_executor().submit(
+                timed_call, ocr_image_batch_or_single, [img_bytes for img_bytes, _, _ in batch], image_timeout_s, deadline
+            ))
+            record_ocr_time(elapsed_ms, len(batch))
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_batcher = None
+
+
+def get_tesseract_batcher():
+    """Return the batcher bound to the running event loop."""
+    global _batcher
+    if _batcher is None or _batcher.loop is not asyncio.get_running_loop():
+        _batcher = TesseractBatcher()
+    return _batcher
+
+
+async def run_tesseract(img_bytes, budget):
+    """OCR one encoded image with the configured backend. Returns (result, outcome)."""
+    if OCR_BACKEND == "batch":
+        return await get_tesseract_batcher().submit(img_bytes, budget)
+    (result, outcome), elapsed_ms = await asyncio.wrap_future(get_ocr_executor().submit(
+        timed_call, ocr_image_with_budget, img_bytes, budget.image_timeout_s, budget.deadline
+    ))
+    if outcome == "ok":
+        record_ocr_time(elapsed_ms)
+    return result, outcome
+
+
+async def ocr_image_cached(img_bytes, stats=None, budget=None, name=None):
+    """
+    OCR one encoded image on the worker pool unless the OCR cache already has it.
+    Cache misses go through triage first (see ocr_triage): images unlikely to contain text are
+    skipped and very large ones are downscaled, with boxes mapped back to original pixels.
+    Tesseract runs under `budget` (an OcrBudget, one per upload); images that time out or need
+    a cheaper retry are recorded on it under `name` and are not cached.
+    `stats` is an optional Counter receiving images_skipped / images_downscaled / images_timed_out / images_degraded.
+    """
+    stats = stats if stats is not None else Counter()
+    budget = budget if budget is not None else OcrBudget()
+    cache = get_ocr_cache()
+    key = ocr_cache_key(img_bytes)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    if OCR_TRIAGE_ENABLED:
+        decision, reason, ocr_bytes, scale = await asyncio.to_thread(triage_image, img_bytes)
+    else:
+        decision, reason, ocr_bytes, scale = "ocr", None, img_bytes, 1.0
+    if decision == "skip":
+        stats["images_skipped"] += 1
+        stats[f"images_skipped_{reason}"] += 1
+        performance_monitor.increment("ocr_triage_skipped")
+        return empty_ocr_result(await asyncio.to_thread(image_size, img_bytes))
+
+    if budget.expired():
+        result, outcome = empty_ocr_result(await asyncio.to_thread(image_size, img_bytes)), "timeout"
+    else:
+        result, outcome = await run_tesseract(ocr_bytes, budget)
+    if decision == "downscale":
+        stats["images_downscaled"] += 1
+        performance_monitor.increment("ocr_triage_downscaled")
+        result = rescale_ocr_result(result, scale, await asyncio.to_thread(image_size, img_bytes))
+
+    budget.record(name, outcome)
+    if outcome != "ok":
+        stats[f"images_{'timed_out' if outcome == 'timeout' else outcome}"] += 1
+        performance_monitor.increment(f"ocr_{outcome}")
+        return result
+    cache.put(key, result)
+    return result
+
+
+async def ocr_images(images, max_in_flight=OCR_MAX_IN_FLIGHT, stats=None, budget=None):
+    """
+    OCR images on the worker pool without blocking the event loop.
+    `images` is an async iterable of (name, img_bytes). Images already in the OCR cache
+    are not sent to Tesseract. At most `max_in_flight` images are in progress at once,
+    and results are yielded as (name, sorted_df, width, height) in input order.
+    """
+    budget = budget if budget is not None else OcrBudget()
+    pending = deque()
+    async for name, img_bytes in images:
+        pending.append((name, asyncio.ensure_future(ocr_image_cached(img_bytes, stats, budget, name))))
+        if len(pending) >= max(1, max_in_flight):
+            name, task = pending.popleft()
+            yield (name, *await task)
+    while pending:
+        name, task = pending.popleft()
+        yield (name, *await task)
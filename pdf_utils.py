@@ -1,119 +1,307 @@
+import asyncio
 import io
 import os
 import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
 import numpy as np
-import glob
-from pytesseract import Output
+from collections import Counter
 import pandas as pd
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from config import NATIVE_TEXT_MIN_WORDS
+from ocr_utils import ocr_images
+from ocr_txt_search_utils import get_text_index
 
-async def extract_text_from_pdfs(files, session_id=None):
+
+def make_text_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=200)
+
+
+def page_words_df(page):
     """
-    Process uploaded PDFs using PyMuPDF to generate image files in the output directory.
-    Then process all .jpeg files in the output_dir using OCR.
-    Returns all OCR text concatenated, and a list of processed file names, chunks, and metadatas.
+    Return the selectable words of a PDF page as a DataFrame with the same
+    text/left/top/width/height columns that Tesseract's image_to_data produces.
+    Words keep PyMuPDF's block/line/word reading order.
     """
-    pdf_names = []
-    output_dir = f"pdf_output/{session_id or 'default'}"
-    os.makedirs(output_dir, exist_ok=True)
-    ocr_text = ""
+    words = page.get_text("words")
+    if not words:
+        return pd.DataFrame(columns=["text", "left", "top", "width", "height"])
+    coords = np.array([w[:4] for w in words], dtype=float)
+    words_df = pd.DataFrame({
+        "text": [w[4] for w in words],
+        "left": coords[:, 0],
+        "top": coords[:, 1],
+        "width": coords[:, 2] - coords[:, 0],
+        "height": coords[:, 3] - coords[:, 1],
+    })
+    return words_df[words_df.text.str.strip() != '']
 
-    # Only process images from PDF
-    for file in files:
-        pdf_names.append(file.filename)
-        contents = await file.read()
-        doc = fitz.open(stream=contents, filetype="pdf")
-        
+
+def is_text_page(words_df):
+    """A page is born-digital when it carries enough selectable words to skip OCR."""
+    return len(words_df) >= NATIVE_TEXT_MIN_WORDS
+
+
+def image_has_text_layer(page, xref, words_df):
+    """True when the native words already cover an image placed on the page (e.g. a scan with an OCR layer)."""
+    if words_df.empty:
+        return False
+    centers_x = (words_df["left"] + words_df["width"] / 2).to_numpy()
+    centers_y = (words_df["top"] + words_df["height"] / 2).to_numpy()
+    for rect in page.get_image_rects(xref):
+        inside = (
+            (centers_x >= rect.x0) & (centers_x <= rect.x1)
+            & (centers_y >= rect.y0) & (centers_y <= rect.y1)
+        )
+        if inside.sum() >= NATIVE_TEXT_MIN_WORDS:
+            return True
+    return False
+
+
+def map_chunks_to_bboxes(sorted_df, chunks):
+    """
+    Map text chunks back to the words they were built from.
+    The page text is ' '.join(words), so each word's character span comes from one
+    cumulative sum; chunk spans are located in the page text and turned into word
+    ranges with searchsorted, and the per-chunk boxes are reduced in bulk.
+    Returns a list of (chunk, [x_min, y_min, x_max, y_max]) tuples.
+    """
+    if not chunks or sorted_df.empty:
+        return []
+    texts = sorted_df['text'].tolist()
+    full_text = ' '.join(texts)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    word_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    word_ends = word_starts + lengths
+
+    # Chunks are substrings of the page text in order (overlaps allowed)
+    chunk_starts = np.empty(len(chunks), dtype=np.int64)
+    chunk_ends = np.empty(len(chunks), dtype=np.int64)
+    search_from = 0
+    for i, chunk in enumerate(chunks):
+        pos = full_text.find(chunk, search_from)
+        if pos == -1:
+            pos = search_from
+        chunk_starts[i] = pos
+        chunk_ends[i] = pos + len(chunk)
+        search_from = pos + 1
+
+    # Word range [first, last) overlapping each chunk span
+    first = np.searchsorted(word_ends, chunk_starts, side='right')
+    last = np.searchsorted(word_starts, chunk_ends, side='left')
+    valid = last > first
+    if not valid.any():
+        return []
+    first, last = first[valid], last[valid]
+
+    left = sorted_df['left'].to_numpy(dtype=float)
+    top = sorted_df['top'].to_numpy(dtype=float)
+    right = left + sorted_df['width'].to_numpy(dtype=float)
+    bottom = top + sorted_df['height'].to_numpy(dtype=float)
+
+    # reduceat over interleaved [first, last) pairs; the padding keeps `last` a valid index
+    bounds = np.empty(2 * len(first), dtype=np.int64)
+    bounds[0::2] = first
+    bounds[1::2] = last
+
+    def reduce(ufunc, values):
+        return ufunc.reduceat(np.append(values, 0), bounds)[0::2].astype(int)
+
+    x_min = reduce(np.minimum, left)
+    y_min = reduce(np.minimum, top)
+    x_max = reduce(np.maximum, right)
+    y_max = reduce(np.maximum, bottom)
+
+    valid_chunks = [chunk for chunk, keep in zip(chunks, valid) if keep]
+    return [
+        (chunk, [int(x_min[i]), int(y_min[i]), int(x_max[i]), int(y_max[i])])
+        for i, chunk in enumerate(valid_chunks)
+    ]
+
+
+# Formats Pillow decodes directly; anything else (jpx, jbig2, jxr, ...) goes through a Pixmap
+PIL_IMAGE_EXTS = {"jpeg", "jpg", "png", "bmp", "gif", "tiff", "tif", "webp"}
+
+
+def decode_pdf_image(doc, xref):
+    """
+    Return (img_bytes, ext) for an embedded image, converted to PNG in memory
+    when Pillow cannot read the stored format.
+    """
+    base_image = doc.extract_image(xref)
+    if base_image and base_image["ext"] in PIL_IMAGE_EXTS:
+        return base_image["image"], base_image["ext"]
+    pix = fitz.Pixmap(doc, xref)
+    if pix.n - pix.alpha >= 4:  # CMYK and friends
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix.tobytes("png"), "png"
+
+
+def iter_pdf_pages(filename, contents):
+    """
+    Walk a PDF held in memory page by page.
+    Yields (page_num, words_df, page_rect, images) where images is a list of
+    (image_name, image_number, img_bytes) for the image-only regions of the page.
+    Each xref is yielded once per document, so logos repeated on every page are OCRed once.
+    """
+    doc = fitz.open(stream=contents, filetype="pdf")
+    seen_xrefs = set()
+    try:
         for page_num, page in enumerate(doc.pages()):
-            # --- Extract images from the page ---
-            img_list = page.get_images(full=True)
-            for img_num, img in enumerate(img_list):
+            words_df = page_words_df(page)
+            text_page = is_text_page(words_df)
+            images = []
+            for img_num, img in enumerate(page.get_images(full=True)):
                 xref = img[0]
-                base_image = doc.extract_image(xref)
-                img_bytes = base_image["image"]
-                ext = base_image["ext"]
-                img_path = os.path.join(output_dir, f"{file.filename}_page{page_num+1}_img{img_num+1}.{ext}")
-                with open(img_path, "wb") as img_file:
-                    img_file.write(img_bytes)
+                if xref in seen_xrefs:
+                    continue
+                # Only image-only regions need Tesseract; the same xref may still need it on another page
+                if text_page and image_has_text_layer(page, xref, words_df):
+                    continue
+                seen_xrefs.add(xref)
+                img_bytes, ext = decode_pdf_image(doc, xref)
+                image_name = f"{filename}_page{page_num+1}_img{img_num+1}.{ext}"
+                images.append((image_name, img_num + 1, img_bytes))
+            yield page_num, words_df, page.rect, images
+    finally:
         doc.close()
 
-    # Only process .jpeg files in the output_dir (OCR with coordinate mapping)
-    jpeg_files = glob.glob(os.path.join(output_dir, "*.jpeg"))
-    ocr_full_text = ""
+
+def native_page_chunks(filename, page_num, words_df, page_rect, text_splitter):
+    """Chunk a born-digital page from its text layer. Returns (page_text, [(chunk, metadata), ...])."""
+    full_page_text = ' '.join(words_df['text'])
+    chunks = text_splitter.split_text(full_page_text)
+    return full_page_text, [
+        (chunk, {
+            "source": filename,
+            "image_file": filename,
+            "image_number": None,
+            "page_number": page_num + 1,
+            "bbox": bbox,
+            "page_width": int(page_rect.width),
+            "page_height": int(page_rect.height)
+        })
+        for chunk, bbox in map_chunks_to_bboxes(words_df, chunks)
+    ]
+
+
+def ocr_image_chunks(image_name, image_number, sorted_df, img_width, img_height, text_splitter):
+    """Chunk the OCR words of one image. Returns (image_text, [(chunk, metadata), ...])."""
+    full_page_text = ' '.join(sorted_df['text'])
+    chunks = text_splitter.split_text(full_page_text)
+    return full_page_text, [
+        (chunk, {
+            "source": image_name,
+            "image_file": image_name,  # <-- Ensures downstream code always has the correct filename
+            "image_number": image_number,
+            "bbox": bbox,
+            "page_width": int(img_width),
+            "page_height": int(img_height)
+        })
+        for chunk, bbox in map_chunks_to_bboxes(sorted_df, chunks)
+    ]
+
+
+def persist_ocr_artifacts(output_dir, image_name, img_bytes, sorted_df):
+    """Write an image and its word coordinates where the viewer expects them, and index its words for text search."""
+    with open(os.path.join(output_dir, image_name), "wb") as img_file:
+        img_file.write(img_bytes)
+    # Write OCR result to a separate .txt file
+    ocr_txt_file = os.path.splitext(os.path.join(output_dir, image_name))[0] + "_coordinates.txt"
+    sorted_df.to_csv(ocr_txt_file, index=False, sep='\t')
+    get_text_index(output_dir).add_words(image_name, None, sorted_df)
+
+
+def safe_filename(filename):
+    """The client-supplied file name without any directory part, so it cannot point outside the session directory."""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    if name in ("", ".", ".."):
+        raise ValueError(f"Invalid file name: {filename!r}")
+    return name
+
+
+async def collect_session_documents(files, output_dir):
+    """
+    Read the uploaded files and save them in the session directory (for the viewer).
+    Returns (pdf_names, documents) where documents lists (filename, contents) of the uploaded PDFs;
+    PDFs from earlier uploads are already in the session index and are not processed again.
+    File names are reduced to their base name (see safe_filename) before they are used anywhere.
+    """
+    pdf_names = []
+    documents = []
+    for file in files:
+        filename = safe_filename(file.filename)
+        pdf_names.append(filename)
+        contents = await file.read()
+        with open(os.path.join(output_dir, filename), "wb") as pdf_file:
+            pdf_file.write(contents)
+        documents.append((filename, contents))
+    return pdf_names, documents
+
+
+async def extract_text_from_pdfs(files, session_id=None, stats=None, budget=None):
+    """
+    Process uploaded PDFs using PyMuPDF, entirely in memory.
+    Pages with a real text layer are chunked straight from their selectable words;
+    embedded images not covered by native text are decoded into buffers and OCRed on the
+    worker pool (see ocr_utils). Only images that yield text are written to the output
+    directory, for the viewer. Only the uploaded PDFs are processed; the returned chunks are
+    appended to the session index (see vectorstore_utils.add_documents_to_vector_store).
+    `stats` is an optional Counter updated with pages_extracted / images_ocred as work progresses,
+    plus the triage counters from ocr_utils.ocr_image_cached. `budget` is an optional
+    ocr_utils.OcrBudget that records which images ran out of OCR time.
+    Returns all OCR text concatenated, and a list of processed file names, chunks, and metadatas.
+    """
+    stats = stats if stats is not None else Counter()
+    output_dir = f"pdf_output/{session_id or 'default'}"
+    os.makedirs(output_dir, exist_ok=True)
+    text_splitter = make_text_splitter()
+
+    pdf_names, documents = await collect_session_documents(files, output_dir)
+
+    text_parts = []
     ocr_chunks = []
     ocr_metadatas = []
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=200)
-
-    for jpeg_file in jpeg_files:
-        img = Image.open(jpeg_file)
-        
-        # Use image_to_data to get detailed OCR output with coordinates
-        ocr_df = pytesseract.image_to_data(img, output_type=Output.DATAFRAME)
-        ocr_df = ocr_df.dropna(subset=["text"])
-        ocr_df["text"] = ocr_df["text"].astype(str)
-        ocr_df = ocr_df[ocr_df.text.str.strip() != '']
-        
-        # Sort words by their vertical and then horizontal position
-        sorted_df = ocr_df.sort_values(by=['top', 'left'], ascending=True)
-        
-        # Reconstruct text from sorted words
-        full_page_text = ' '.join(sorted_df['text'])
-        ocr_full_text += f"File: {os.path.basename(jpeg_file)}\n{full_page_text}\n\n"
-
-        # Write OCR result to a separate .txt file
-        ocr_txt_file = os.path.splitext(jpeg_file)[0] + "_coordinates.txt"
-        sorted_df.to_csv(ocr_txt_file, index=False, sep='\t')
-
-        # Chunk the full text
-        chunks = text_splitter.split_text(full_page_text)
-        
-        # Map chunks back to words and their bounding boxes
-        word_idx = 0
-        for chunk in chunks:
-            chunk_words = []
-            chunk_text_covered = ""
-            
-            # Find the words from the dataframe that make up the current chunk
-            while word_idx < len(sorted_df) and len(chunk_text_covered) < len(chunk):
-                word_data = sorted_df.iloc[word_idx]
-                chunk_words.append(word_data)
-                chunk_text_covered += word_data['text'] + ' '
-                word_idx += 1
-
-            if not chunk_words:
-                continue
-
-            # Calculate the bounding box for the entire chunk
-            x_min = min(int(w['left']) for w in chunk_words)
-            y_min = min(int(w['top']) for w in chunk_words)
-            x_max = max(int(w['left'] + w['width']) for w in chunk_words)
-            y_max = max(int(w['top'] + w['height']) for w in chunk_words)
-            
-            # Extract image number from filename
-            base = os.path.basename(jpeg_file)
-            img_num = None
-            import re
-            match = re.search(r'_img(\d+)', base)
-            if match:
-                img_num = int(match.group(1))
+    # Image bytes wait here only while their OCR is in flight
+    images_in_flight = {}
 
+    def image_stream():
+        for filename, contents in documents:
+            for page_num, words_df, page_rect, images in iter_pdf_pages(filename, contents):
+                stats["pages_extracted"] += 1
+                # --- Native text layer: no OCR needed ---
+                if is_text_page(words_df):
+                    page_text, chunk_metas = native_page_chunks(filename, page_num, words_df, page_rect, text_splitter)
+                    get_text_index(output_dir).add_words(filename, page_num + 1, words_df)
+                    text_parts.append(f"File: {filename} (page {page_num+1})\n{page_text}\n\n")
+                    for chunk, meta in chunk_metas:
+                        ocr_chunks.append(chunk)
+                        ocr_metadatas.append(meta)
+                for image_name, image_number, img_bytes in images:
+                    images_in_flight[image_name] = (image_number, img_bytes)
+                    yield image_name, img_bytes
+
+    async def offloaded(iterator):
+        # Each step parses a page with PyMuPDF, which blocks; run it off the event loop
+        while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+            yield item
+
+    # OCR runs on the worker pool; results come back in page order
+    async for image_name, sorted_df, img_width, img_height in ocr_images(offloaded(image_stream()), stats=stats, budget=budget):
+        image_number, img_bytes = images_in_flight.pop(image_name)
+        stats["images_ocred"] += 1
+        if sorted_df.empty:
+            continue
+        persist_ocr_artifacts(output_dir, image_name, img_bytes, sorted_df)
+        page_text, chunk_metas = ocr_image_chunks(image_name, image_number, sorted_df, img_width, img_height, text_splitter)
+        text_parts.append(f"File: {image_name}\n{page_text}\n\n")
+        for chunk, meta in chunk_metas:
             ocr_chunks.append(chunk)
-            meta = {
-                "source": base,
-                "image_file": base,  # <-- Ensures downstream code always has the correct filename
-                "image_number": int(img_num) if img_num is not None else None,
-                "bbox": [int(x_min), int(y_min), int(x_max), int(y_max)],
-                "page_width": int(img.width),
-                "page_height": int(img.height)
-            }
             ocr_metadatas.append(meta)
 
-    # Write all OCR text to a single file in the output directory
+    # Append the upload's OCR text to the session's text file in the output directory
+    ocr_full_text = "".join(text_parts)
     ocr_full_text_path = os.path.join(output_dir, "ocr_full_text.txt")
-    with open(ocr_full_text_path, "w", encoding="utf-8") as f:
+    with open(ocr_full_text_path, "a", encoding="utf-8") as f:
         f.write(ocr_full_text)
-        
-    return ocr_full_text, ocr_full_text, pdf_names, ocr_chunks, ocr_metadatas 
\ No newline at end of file
+
+    return ocr_full_text, ocr_full_text, pdf_names, ocr_chunks, ocr_metadatas
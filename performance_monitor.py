@@ -14,8 +14,15 @@ class PerformanceMonitor:
             "vector_store_loading": [],
             "similarity_search": [],
             "llm_inference": [],
+            "time_to_first_token": [],
             "api_endpoints": {}
         }
+        # Event counts (cache hits/misses, evictions, ...) rather than latencies
+        self.counters = {}
+    
+    def increment(self, counter_name: str, amount: int = 1):
+        """Increase a named event counter"""
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + amount
     
     def timing_decorator(self, operation_name: str):
         def decorator(func):
@@ -55,6 +62,8 @@ class PerformanceMonitor:
                     "p95_ms": round(statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else latencies[0], 2),
                     "std_dev_ms": round(statistics.stdev(latencies) if len(latencies) > 1 else 0, 2)
                 }
+        if self.counters:
+            summary["counters"] = dict(self.counters)
         return summary
     
     def save_metrics_to_file(self, filename: str = None):
@@ -67,7 +76,8 @@ class PerformanceMonitor:
             json.dump({
                 "timestamp": datetime.now().isoformat(),
                 "summary": self.get_metrics_summary(),
-                "raw_data": self.metrics
+                "raw_data": self.metrics,
+                "counters": self.counters
             }, f, indent=2)
         print(f"Metrics saved to {filename}")
 
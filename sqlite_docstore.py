@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+SCHEMA = """
+CREATE TABLE chunks (
+    position INTEGER PRIMARY KEY,  -- row of the chunk's vector in the FAISS index
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL  -- JSON
+)
+"""
+
+# BM25 keyword index over the chunk texts, reading them from the chunks table
+KEYWORD_SCHEMA = """
+CREATE VIRTUAL TABLE chunks_fts USING fts5(
+    text, content='chunks', content_rowid='position', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk texts and metadata of a saved session index, fetched from SQLite on demand.
+    The database lives in an index version directory, which never changes once published,
+    so it is opened read-only and immutable (no locking). Documents added after loading are
+    kept in memory until the vector store is saved, which writes a new database (write_docstore).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pending = {}  # id -> Document added since the database was written
+        self._lock = threading.Lock()
+        self._conn = None
+        self.base_count = 0
+        if path is not None:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self.base_count = self.query("SELECT COUNT(*) FROM chunks")[0][0]
+        self.has_keyword_index = bool(self.query("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"))
+
+    def query(self, sql, params=()):
+        if self._conn is None:
+            return []
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def search(self, search):
+        doc = self.pending.get(search)
+        if doc is not None:
+            return doc
+        rows = self.query("SELECT text, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        text, metadata = rows[0]
+        return Document(id=search, page_content=text, metadata=json.loads(metadata))
+
+    def add(self, texts):
+        overlapping = set(texts).intersection(self.pending)
+        for doc_id in set(texts).difference(overlapping):
+            if self.query("SELECT 1 FROM chunks WHERE id = ?", (doc_id,)):
+                overlapping.add(doc_id)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self.pending.update(texts)
+
+    def keyword_search(self, match, k):
+        """Top k saved documents for an FTS5 MATCH expression, best BM25 score first."""
+        if not self.has_keyword_index:
+            return []
+        rows = self.query(
+            "SELECT c.id, c.text, c.metadata FROM chunks_fts JOIN chunks c ON c.position = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?", (match, k)
+        )
+        return [Document(id=doc_id, page_content=text, metadata=json.loads(metadata)) for doc_id, text, metadata in rows]
+
+    def backup_to(self, conn):
+        with self._lock:
+            self._conn.backup(conn)
+
+
+class SQLiteIndexToDocstoreId(Mapping):
+    """
+    FAISS row -> chunk id mapping read from a SQLiteDocstore, standing in for the dict
+    LangChain's FAISS keeps in memory. Rows appended since loading are held in a list.
+    """
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+        self.pending_ids = []
+
+    def __getitem__(self, position):
+        position = int(position)
+        if position >= self.docstore.base_count:
+            pending_position = position - self.docstore.base_count
+            if pending_position >= len(self.pending_ids):
+                raise KeyError(position)
+            return self.pending_ids[pending_position]
+        rows = self.docstore.query("SELECT id FROM chunks WHERE position = ?", (position,))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __len__(self):
+        return self.docstore.base_count + len(self.pending_ids)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def values(self):
+        ids = [doc_id for (doc_id,) in self.docstore.query("SELECT id FROM chunks ORDER BY position")]
+        return ids + self.pending_ids
+
+    def update(self, mapping):
+        """Record appended rows; FAISS only ever adds rows at the end of the index."""
+        for position, doc_id in sorted(mapping.items()):
+            if position != len(self):
+                raise ValueError(f"Expected FAISS row {len(self)}, got {position}")
+            self.pending_ids.append(doc_id)
+
+
+def load_docstore(index_dir):
+    """(docstore, index_to_docstore_id) for the SQLite docstore saved in index_dir."""
+    docstore = SQLiteDocstore(os.path.join(index_dir, DOCSTORE_FILE))
+    return docstore, SQLiteIndexToDocstoreId(docstore)
+
+
+def write_docstore(index_dir, docstore, index_to_docstore_id):
+    """
+    Write a vector store's documents to a new SQLite database in index_dir.
+    A loaded SQLiteDocstore is copied with the SQLite backup API and its pending documents
+    appended; any other docstore (a new index, or one read from a legacy pickle) is written in full.
+    The new rows are added to the keyword index (see index_keywords).
+    """
+    conn = sqlite3.connect(os.path.join(index_dir, DOCSTORE_FILE))
+    try:
+        if isinstance(docstore, SQLiteDocstore) and docstore.path is not None:
+            docstore.backup_to(conn)
+            start = docstore.base_count
+        else:
+            conn.execute(SCHEMA)
+            start = 0
+
+        def rows():
+            for position in range(start, len(index_to_docstore_id)):
+                doc_id = index_to_docstore_id[position]
+                doc = docstore.search(doc_id)
+                yield position, doc_id, doc.page_content, json.dumps(doc.metadata, default=str)
+
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows())
+        index_keywords(conn, start)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def index_keywords(conn, start):
+    """Add the chunks from row `start` on to the FTS5 keyword index, creating it over all rows if missing."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone():
+        conn.execute("INSERT INTO chunks_fts(rowid, text) SELECT position, text FROM chunks WHERE position >= ?", (start,))
+        return
+    try:
+        conn.execute(KEYWORD_SCHEMA)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: retrieval falls back to vector search only
+        print(f"[VECTOR STORE] Keyword index unavailable: {e}")
+        return
+    conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
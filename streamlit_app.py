@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import shutil
 import os
+import json
+import time
 from dotenv import load_dotenv
 #from langgraph_workflow import visualize_workflow_mermaid
 #from streamlit_mermaid import st_mermaid
@@ -71,11 +73,60 @@ def display_source_file(source_files_str, session_id, bboxes=None):
             st.warning(f"Source file '{source_file}' not found.")
 
 
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent events response such as /chat/stream."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+def render_ingest_job(job, progress_bar, status_text):
+    progress = job.get("progress", {})
+    pages_fraction = progress.get("pages_extracted", 0) / max(progress.get("pages_total", 0), 1)
+    chunks_fraction = progress.get("chunks_indexed", 0) / max(progress.get("chunks_total", 0), 1)
+    progress_bar.progress(1.0 if job["status"] == "completed" else min(1.0, 0.5 * pages_fraction + 0.5 * chunks_fraction))
+    status_text.markdown(
+        f"**{job['status'].capitalize()}** · pages extracted: {progress.get('pages_extracted', 0)}/{progress.get('pages_total', '?')} · "
+        f"images OCRed: {progress.get('images_ocred', 0)} · "
+        f"chunks indexed: {progress.get('chunks_indexed', 0)}/{progress.get('chunks_total', '?')}"
+    )
+
+
+def poll_ingest_job(job_id, interval=1.0):
+    """
+    Poll /jobs/{job_id} until the upload is searchable or finished, showing per-stage progress.
+    Indexing continues in the background after the first commit; chat can start right away.
+    """
+    progress_bar = st.progress(0.0)
+    status_text = st.empty()
+    while True:
+        job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+        render_ingest_job(job, progress_bar, status_text)
+        if job["status"] in ("completed", "failed", "cancelled") or job.get("searchable"):
+            return job
+        time.sleep(interval)
+
+
 def main():
     st.set_page_config(page_title="Chat with multiple PDFs", page_icon=":books:")
     st.header("Chat with multiple PDFs (v1) :books:")
     # Remove: audio_file = st.file_uploader("Upload an audio file", type=["mp3", "wav", "m4a", "webm"])
     
+    # Show progress of an upload that is still being indexed in the background
+    if st.session_state.get("ingest_job_id"):
+        job = requests.get(f"{BACKEND_URL}/jobs/{st.session_state.ingest_job_id}").json()
+        if job.get("status") in ("queued", "running"):
+            render_ingest_job(job, st.progress(0.0), st.empty())
+        else:
+            st.session_state.ingest_job_id = None
+
     # Display conversation history using chat messages
     if st.session_state.conversation_history:
         st.write("### Conversation History")
@@ -110,22 +161,39 @@ def main():
         elif not st.session_state.session_id:
             st.warning("Please upload and process PDFs first.")
         else:
-            with st.spinner("Getting answer..."):
-                data = {"query": user_question, "session_id": st.session_state.session_id}
-                response = requests.post(f"{BACKEND_URL}/chat/", data=data)
+            data = {"query": user_question, "session_id": st.session_state.session_id}
+            with requests.post(f"{BACKEND_URL}/chat/stream", data=data, stream=True) as response:
                 if response.status_code == 200:
-                    result = response.json()
-                    print(f"**Result:** {result['answer']}")
-                    st.session_state.conversation_history.append({
-                        "question": user_question,
-                        "answer": result["answer"],
-                        "timestamp": result.get("timestamp", ""),
-                        "bboxes": result.get("bboxes") # Store bboxes
-                    })
-                    # Set flags to clear prompt and speech boxes after answer
-                    st.session_state['clear_user_question'] = True
-                    st.session_state['clear_speech_text'] = True
-                    st.rerun() # Rerun to display the new message and full history
+                    result = {}
+
+                    def answer_tokens():
+                        # Tokens are shown as they arrive; the "done" event carries the final answer
+                        for event, payload in iter_sse(response):
+                            if event == "token":
+                                yield payload["text"]
+                            elif event == "restart":
+                                yield "\n\n*Not found in the documents, searching the web...*\n\n"
+                            elif event in ("done", "error"):
+                                result.update(payload)
+
+                    with st.chat_message("user", avatar="🧑‍💻"):
+                        st.markdown(user_question)
+                    with st.chat_message("assistant", avatar="🤖"):
+                        st.write_stream(answer_tokens())
+                    if "answer" in result:
+                        print(f"**Result:** {result['answer']}")
+                        st.session_state.conversation_history.append({
+                            "question": user_question,
+                            "answer": result["answer"],
+                            "timestamp": result.get("timestamp", ""),
+                            "bboxes": result.get("bboxes") # Store bboxes
+                        })
+                        # Set flags to clear prompt and speech boxes after answer
+                        st.session_state['clear_user_question'] = True
+                        st.session_state['clear_speech_text'] = True
+                        st.rerun() # Rerun to display the new message and full history
+                    else:
+                        st.error(result.get("error", "Failed to get answer."))
                 else:
                     st.error(response.json().get("error", "Failed to get answer."))
 
@@ -768,16 +836,23 @@ with st.sidebar:
             with st.spinner("🔄 Processing your documents..."):
                 try:
                     files = [("files", (pdf.name, pdf, pdf.type)) for pdf in pdf_docs]
-                    data = {}
+                    data = {"async_job": "true"}
                     if st.session_state.session_id:
                         data["session_id"] = st.session_state.session_id
                     
-                    response = requests.post(f"https://chatbot5592.azurewebsites.net/upload_pdf/", files=files, data=data)
+                    response = requests.post(f"{BACKEND_URL}/upload_pdfs/", files=files, data=data)
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        st.session_state.session_id = result["session_id"]
-                        st.success(f"✅ Successfully uploaded {len(pdf_docs)} PDF(s). Chunks: {result['chunks']}")
+                    if response.status_code == 202:
+                        job = response.json()
+                        st.session_state.session_id = job["session_id"]
+                        job = poll_ingest_job(job["job_id"])
+                        if job["status"] == "completed":
+                            st.success(f"✅ Successfully uploaded {len(pdf_docs)} PDF(s). Chunks: {job['result']['chunks']}")
+                        elif job["status"] not in ("failed", "cancelled"):
+                            st.session_state.ingest_job_id = job["job_id"]
+                            st.success("✅ The first pages are indexed, you can start asking questions while the rest is processed.")
+                        else:
+                            st.error(f"❌ {job.get('error') or 'Failed to process PDFs.'}")
                     else:
                         try:
                             error_msg = response.json().get("error", "Failed to upload PDFs.")
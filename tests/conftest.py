@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+# Offline embeddings for every test; config reads the environment when first imported
+os.environ.setdefault("EMBEDDING_PROVIDER", "local")
+
+
+@pytest.fixture(autouse=True)
+def session_workdir(monkeypatch, tmp_path):
+    """Run each test in its own directory with fresh process-wide caches and session state."""
+    import answer_cache
+    import conversation_context
+    import embedding_cache
+    import history
+    import vector_store_registry
+    import vectorstore_utils
+
+    async def summarize_conversation(summary, turns, max_words, **kwargs):
+        return (summary + " " if summary else "") + f"{turns.count('User:')} earlier turns."
+
+    monkeypatch.chdir(tmp_path)
+    # Conversation summaries are written without calling Gemini
+    monkeypatch.setattr(conversation_context, "summarize_conversation", summarize_conversation)
+    monkeypatch.setattr(answer_cache, "_answer_cache", None)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
+    monkeypatch.setattr(vector_store_registry, "_vector_store_registry", None)
+    monkeypatch.setattr(vectorstore_utils, "_session_write_locks", {})
+    history.session_history_store.clear()
+    history.session_summary_store.clear()
+    yield tmp_path
+    history.session_history_store.clear()
+    history.session_summary_store.clear()
@@ -0,0 +1,40 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import langgraph_workflow
+from answer_cache import AnswerCache
+from history import get_history
+from llm_utils import QAChain
+from vectorstore_utils import add_documents_to_vector_store
+
+
+def ask(query, session_id="s"):
+    state = {"query": query, "session_id": session_id, "answer": "", "performance": {}, "messages": get_history(session_id)}
+    result = asyncio.run(langgraph_workflow.run_chat_workflow_async(state))
+    return result["answer"], result["performance"].get("answer_cache")
+
+
+def test_repeated_question_in_a_session_hits(monkeypatch):
+    answers = iter(f"Answer {i}" for i in range(10))
+    monkeypatch.setattr(langgraph_workflow, "get_chain", lambda context_type="local": QAChain(
+        GenericFakeChatModel(messages=iter([next(answers)])), "{context}\n{question}"
+    ))
+    asyncio.run(add_documents_to_vector_store(["Pump seals are replaced every 100 hours.", "Valves are checked weekly."], "s"))
+
+    assert ask("How often are pump seals replaced?") == ("Answer 0", "miss")
+    assert ask("How often are pump seals replaced?") == ("Answer 0", "hit")
+    assert ask("how often are PUMP seals replaced") == ("Answer 0", "hit")
+    assert ask("And the second one?") == ("Answer 1", "bypass")
+    assert ask("And the second one?") == ("Answer 2", "bypass")
+
+
+def test_lookup_requires_the_same_retrieved_chunks():
+    cache = AnswerCache(max_entries=10, ttl_s=60, similarity=0.95)
+    cache.store("s", "v1", "Which pump?", [1.0, 0.0], ["a", "b"], "Pump 1", "Google AI")
+    assert cache.lookup("s", "v1", "which pump", [1.0, 0.0], ["b", "a"])[1] == "hit"
+    assert cache.lookup("s", "v1", "Which pump is it", [0.99, 0.05], ["a", "b"])[1] == "near_hit"
+    assert cache.lookup("s", "v1", "Which pump?", [1.0, 0.0], ["a", "c"]) == (None, "miss")
+    assert cache.lookup("s", "v2", "Which pump?", [1.0, 0.0], ["a", "b"]) == (None, "miss")
+    cache.invalidate("s")
+    assert cache.lookup("s", "v1", "Which pump?", [1.0, 0.0], ["a", "b"]) == (None, "miss")
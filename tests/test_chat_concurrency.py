@@ -0,0 +1,23 @@
+import asyncio
+
+import langgraph_workflow
+from benchmarks.bench_chat_concurrency import StandInChatModel, run_chats
+from llm_utils import QAChain
+from vectorstore_utils import add_documents_to_vector_store
+
+N_CHATS = 8
+LLM_LATENCY_S = 1.0
+
+
+def test_concurrent_chats_do_not_block_the_event_loop(monkeypatch):
+    # Every chat must reach the LLM
+    monkeypatch.setattr(langgraph_workflow, "ANSWER_CACHE_ENABLED", False)
+    model = StandInChatModel(latency=LLM_LATENCY_S)
+    monkeypatch.setattr(langgraph_workflow, "get_chain", lambda context_type="local": QAChain(model, "{context}\n{question}"))
+    chunks = [f"Pump {i} maintenance: replace the seals every {100 + i} hours." for i in range(200)]
+    asyncio.run(add_documents_to_vector_store(chunks, "bench"))
+
+    elapsed, max_stall = asyncio.run(run_chats(N_CHATS))
+
+    assert elapsed < 3 * LLM_LATENCY_S, f"{N_CHATS} chats took {elapsed:.2f}s"
+    assert max_stall < 0.25, f"event loop stalled for {max_stall * 1000:.0f}ms"
@@ -0,0 +1,36 @@
+import asyncio
+
+import conversation_context
+from conversation_context import build_context_from_history, update_summary
+from history import get_summary, save_history
+
+
+def turn(i, answer_chars):
+    return {"question": f"question {i}", "answer": "x" * answer_chars}
+
+
+def test_recent_turns_over_the_budget_are_not_kept_verbatim():
+    messages = [turn(i, 5000) for i in range(3)]  # about 1250 tokens each
+    context, kept = build_context_from_history(messages, "next?", token_budget=2000, recent_turns=4)
+    assert kept == 1
+    assert "question 2" in context and "question 1" not in context
+
+
+def test_turns_dropped_for_the_budget_are_folded_into_the_summary(monkeypatch):
+    folded = []
+
+    async def summarize(summary, turns, max_words, **kwargs):
+        folded.append(turns)
+        return "pumps 0 and 1 discussed"
+
+    monkeypatch.setattr(conversation_context, "summarize_conversation", summarize)
+    for i in range(3):
+        save_history("s", f"question {i}", "x" * 5000, "Google AI", "", "N/A")
+
+    asyncio.run(update_summary("s"))
+
+    assert get_summary("s") == {"summary": "pumps 0 and 1 discussed", "turns": 2}
+    assert "question 0" in folded[0] and "question 1" in folded[0] and "question 2" not in folded[0]
+    context, kept = build_context_from_history(conversation_context.session_history_store["s"], "next?", get_summary("s"))
+    assert kept == 1
+    assert context.startswith("Summary of the earlier conversation:\npumps 0 and 1 discussed")
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import ingest_jobs
+from ingest_jobs import IngestJobScheduler, InMemoryUploadFile
+
+
+def test_cancelled_jobs_end_in_a_terminal_state(monkeypatch):
+    started = []
+
+    async def slow_ingest(job, files):
+        started.append(job.job_id)
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(ingest_jobs, "run_ingest", slow_ingest)
+
+    async def run():
+        scheduler = IngestJobScheduler(max_concurrent=1)
+        running = scheduler.submit("s1", [InMemoryUploadFile("a.pdf", b"")])
+        queued = scheduler.submit("s1", [InMemoryUploadFile("b.pdf", b"")])
+        await asyncio.sleep(0.01)
+        assert (running.status, queued.status) == ("running", "queued")
+        tasks = list(scheduler._tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        return running, queued
+
+    running, queued = asyncio.run(run())
+
+    assert started == [running.job_id]
+    for job in (running, queued):
+        assert job.status == "cancelled"
+        assert job.finished_at is not None
+
+
+def test_cancel_session_only_stops_that_sessions_jobs(monkeypatch):
+    async def slow_ingest(job, files):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(ingest_jobs, "run_ingest", slow_ingest)
+
+    async def run():
+        scheduler = IngestJobScheduler(max_concurrent=2)
+        jobs = [scheduler.submit(session_id, [InMemoryUploadFile("a.pdf", b"")]) for session_id in ("s1", "s1", "s2")]
+        await asyncio.sleep(0.01)
+        cancelled = await scheduler.cancel_session("s1")
+        statuses = [job.status for job in jobs]
+        await scheduler.cancel_session("s2")
+        return cancelled, statuses
+
+    cancelled, statuses = asyncio.run(run())
+
+    assert cancelled == 2
+    assert statuses == ["cancelled", "cancelled", "running"]
+
+
+def test_cancelled_index_stage_waits_for_its_thread():
+    import threading
+    import time
+
+    from ingest_pipeline import StreamingIngest
+
+    finished = threading.Event()
+
+    def slow_save():
+        time.sleep(0.2)
+        finished.set()
+
+    async def run():
+        task = asyncio.create_task(StreamingIngest._in_thread(slow_save))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return finished.is_set()
+
+    assert asyncio.run(run())
@@ -0,0 +1,60 @@
+import asyncio
+import io
+from collections import Counter
+
+from PIL import Image
+
+import ocr_utils
+from ocr_cache import OcrCache
+from ocr_utils import OcrBudget, empty_ocr_result, rescale_ocr_result
+
+
+def png_bytes(size):
+    buffer = io.BytesIO()
+    Image.new("L", size, 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_rescale_empty_result_keeps_original_size():
+    words_df, width, height = rescale_ocr_result(empty_ocr_result((100, 200)), 0.5, (100, 200))
+    assert words_df.empty
+    assert (width, height) == (100, 200)
+
+
+def test_downscaled_image_past_upload_deadline_returns_empty_result(monkeypatch, tmp_path):
+    img_bytes = png_bytes((400, 300))
+    monkeypatch.setattr(ocr_utils, "get_ocr_cache", lambda: OcrCache(str(tmp_path)))
+    monkeypatch.setattr(ocr_utils, "triage_image", lambda data: ("downscale", None, png_bytes((200, 150)), 0.5))
+    stats = Counter()
+    budget = OcrBudget(upload_timeout_s=0)
+
+    words_df, width, height = asyncio.run(ocr_utils.ocr_image_cached(img_bytes, stats, budget, "big.png"))
+
+    assert words_df.empty
+    assert (width, height) == (400, 300)
+    assert stats["images_downscaled"] == 1
+    assert stats["images_timed_out"] == 1
+    assert budget.timed_out == ["big.png"]
+
+
+def test_batcher_keeps_dispatch_tasks_until_they_finish(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ocr_utils, "get_ocr_executor", lambda: executor)
+    monkeypatch.setattr(ocr_utils, "ocr_image_batch_or_single",
+                        lambda images, timeout_s, deadline: [(len(img), "ok") for img in images])
+
+    async def run():
+        batcher = ocr_utils.TesseractBatcher(batch_size=2, max_delay_ms=1)
+        futures = [batcher.submit(bytes(n), OcrBudget()) for n in range(1, 4)]
+        assert len(batcher._tasks) == 1  # the full batch is dispatched, the third image waits
+        results = await asyncio.gather(*futures)
+        await asyncio.sleep(0)
+        return results, batcher._tasks
+
+    results, tasks = asyncio.run(run())
+    executor.shutdown()
+
+    assert results == [(1, "ok"), (2, "ok"), (3, "ok")]
+    assert not tasks
@@ -0,0 +1,27 @@
+import io
+
+import fitz
+from PIL import Image
+
+from pdf_utils import iter_pdf_pages
+
+
+def png_bytes(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_image_skipped_under_text_layer_is_still_yielded_on_an_image_only_page():
+    img_bytes = png_bytes((40, 40))
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(60, 60, 300, 300), stream=img_bytes)
+    page.insert_text((72, 80), "\n".join(" ".join(["covered"] * 8) for _ in range(20)))
+    doc.new_page().insert_image(fitz.Rect(60, 60, 300, 300), stream=img_bytes)
+    doc.new_page().insert_image(fitz.Rect(60, 60, 300, 300), stream=img_bytes)
+
+    pages = list(iter_pdf_pages("doc.pdf", doc.tobytes()))
+
+    assert [len(images) for _, _, _, images in pages] == [0, 1, 0]
+    assert pages[1][3][0][0] == "doc.pdf_page2_img1.png"
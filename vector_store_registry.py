@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+from config import VECTOR_STORE_CACHE_MAX_BYTES
+from performance_monitor import performance_monitor
+
+
+def estimate_vector_store_bytes(vector_store):
+    """Approximate size of a FAISS store: the float32 vectors plus the texts of an in-memory docstore."""
+    index = vector_store.index
+    size = index.ntotal * index.d * 4
+    for doc in getattr(vector_store.docstore, "_dict", {}).values():
+        size += len(doc.page_content) + 64 * len(doc.metadata)
+    return size
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide cache of loaded session indexes.
+    Entries are evicted least-recently-used first once their estimated size passes
+    `max_bytes`. Writers call invalidate() after changing a session's index on disk;
+    a load that raced with an invalidation is returned but not cached.
+    """
+
+    def __init__(self, max_bytes=VECTOR_STORE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # session_id -> (vector_store, size in bytes), oldest first
+        self._generations = {}  # session_id -> invalidation count
+        self._total_bytes = 0
+
+    def get(self, session_id, loader):
+        """Return the session's vector store, calling loader(session_id) on a miss."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                performance_monitor.increment("vector_store_cache_hits")
+                return entry[0]
+            generation = self._generations.get(session_id, 0)
+        performance_monitor.increment("vector_store_cache_misses")
+
+        vector_store = loader(session_id)
+        size = estimate_vector_store_bytes(vector_store)
+        with self._lock:
+            if self._generations.get(session_id, 0) != generation or size > self.max_bytes:
+                return vector_store
+            self._total_bytes += size - self._entries.pop(session_id, (None, 0))[1]
+            self._entries[session_id] = (vector_store, size)
+            evicted = 0
+            while self._total_bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted += 1
+        if evicted:
+            performance_monitor.increment("vector_store_cache_evictions", evicted)
+        return vector_store
+
+    def invalidate(self, session_id):
+        """Drop a session's cached index after it was rebuilt, extended or deleted."""
+        with self._lock:
+            self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+        if entry is not None:
+            performance_monitor.increment("vector_store_cache_invalidations")
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+
+_vector_store_registry = None
+
+
+def get_vector_store_registry():
+    """Return the process-wide vector store registry."""
+    global _vector_store_registry
+    if _vector_store_registry is None:
+        _vector_store_registry = VectorStoreRegistry()
+    return _vector_store_registry
@@ -1,25 +1,231 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from pydantic import SecretStr
-from config import GOOGLE_API_KEY
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import numpy as np
+from faiss_index_types import INDEX_TYPES, choose_index_type, index_type_of, build_faiss_index, tune_index, index_vectors
+from embedding_providers import create_embedding_model, embedding_signature
+from sqlite_docstore import DOCSTORE_FILE, load_docstore, write_docstore
+from config import FAISS_INDEX_MMAP
+import faiss
+from collections import Counter
+from vector_store_registry import get_vector_store_registry
+from embedding_cache import get_embedding_cache
+from embedding_engine import get_embedding_engine
+from answer_cache import get_answer_cache
+import asyncio
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
+
+_embedding_model = None
+_session_write_locks = {}
 
 def chunk_text(text):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
     return text_splitter.split_text(text)
 
-def create_vector_store(chunks, session_id, metadatas=None):
-    embedding_model = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001", google_api_key=SecretStr(GOOGLE_API_KEY))
-    if metadatas is not None:
-        vector_store = FAISS.from_texts(chunks, embedding=embedding_model, metadatas=metadatas)
-    else:
-        vector_store = FAISS.from_texts(chunks, embedding=embedding_model)
-    vector_store.save_local(f"faiss_index/{session_id}")
+def get_embedding_model():
+    """Return the process-wide embeddings client, creating it on first use."""
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = create_embedding_model()
+    return _embedding_model
+
+def embedding_model_name(embedding_model):
+    return getattr(embedding_model, "model", type(embedding_model).__name__)
+
+async def embed_documents_cached(embedding_model, texts, stats=None):
+    """
+    Embed texts, calling the embedding API only for texts missing from the embedding cache.
+    Misses are deduplicated and sent through the process-wide EmbeddingEngine (token-budgeted,
+    concurrent, rate-limit aware batches). `stats` is an optional Counter receiving chunks_embedded
+    (all texts), embeddings_cached (texts served from the cache) and the engine's throughput counters.
+    Returns one float vector per text.
+    """
+    stats = stats if stats is not None else Counter()
+    cache = get_embedding_cache()
+    model_name = embedding_model_name(embedding_model)
+    vectors = await asyncio.to_thread(cache.get_many, model_name, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    stats["embeddings_cached"] += len(texts) - sum(1 for vector in vectors if vector is None)
+    embedded = {}
+    if missing:
+        missing_vectors = await get_embedding_engine(embedding_model).embed(missing, stats)
+        await asyncio.to_thread(cache.put_many, model_name, missing, missing_vectors)
+        embedded = dict(zip(missing, missing_vectors))
+    stats["chunks_embedded"] += len(texts)
+    return [vector.tolist() if vector is not None else embedded[text] for text, vector in zip(texts, vectors)]
+
+def chunk_id(chunk, metadata):
+    """Stable id of a chunk (its text and where it came from), so re-uploaded content is recognised."""
+    key = json.dumps([chunk, metadata], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def session_write_lock(session_id):
+    """asyncio.Lock serialising the writers (uploads, ingest jobs) of one session's index."""
+    return _session_write_locks.setdefault(session_id, asyncio.Lock())
+
+def append_embeddings(vector_store, texts, vectors, metadatas, ids, embedding_model):
+    """
+    Append embedded chunks to a vector store, creating it when vector_store is None.
+    The FAISS index family follows the total vector count (see faiss_index_types.choose_index_type);
+    when an append crosses a threshold the index is rebuilt as the larger family. Indexes are
+    never rebuilt as a smaller family (IVF-PQ vectors cannot be recovered exactly).
+    """
+    new_vectors = np.asarray(vectors, dtype=np.float32)
+    current_total = vector_store.index.ntotal if vector_store is not None else 0
+    index_type = choose_index_type(current_total + len(new_vectors))
+    if vector_store is None or INDEX_TYPES.index(index_type) > INDEX_TYPES.index(index_type_of(vector_store.index)):
+        vector_store = rebuild_vector_store(vector_store, index_type, new_vectors, embedding_model)
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+    return vector_store
+
+def rebuild_vector_store(vector_store, index_type, new_vectors, embedding_model):
+    """
+    Move a vector store (or nothing) onto an empty index of `index_type`, trained on its vectors
+    plus the ones about to be added. Docstore entries and their ids are kept.
+    """
+    existing = index_vectors(vector_store.index) if vector_store is not None else new_vectors[:0]
+    index = build_faiss_index(index_type, new_vectors.shape[1], np.concatenate([existing, new_vectors]))
+    if vector_store is None:
+        return FAISS(embedding_model, index, InMemoryDocstore(), {})
+    print(f"[VECTOR STORE] Rebuilding {index_type_of(vector_store.index)} index of {len(existing)} vectors as {index_type}")
+    index.add(existing)
+    vector_store.index = index
+    return vector_store
+
+async def add_documents_to_vector_store(chunks, session_id, metadatas=None, stats=None):
+    """
+    Add chunks to the session's FAISS index, creating it on the first upload.
+    Chunks already in the index (same text and metadata) are skipped, so only new chunks are
+    embedded. `stats` is an optional Counter receiving chunks_deduplicated plus the counters
+    of embed_documents_cached. Returns the number of chunks added.
+    """
+    stats = stats if stats is not None else Counter()
+    metadatas = metadatas if metadatas is not None else [{} for _ in chunks]
+    embedding_model = get_embedding_model()
+    async with session_write_lock(session_id):
+        # A private copy: the registry's instance may be serving chats while this one is extended
+        vector_store = await asyncio.to_thread(read_vector_store_if_exists, session_id)
+        known_ids = set(vector_store.index_to_docstore_id.values()) if vector_store is not None else set()
+        new_chunks = {}
+        for chunk, metadata in zip(chunks, metadatas):
+            new_chunks.setdefault(chunk_id(chunk, metadata), (chunk, metadata))
+        for known_id in known_ids.intersection(new_chunks):
+            del new_chunks[known_id]
+        stats["chunks_deduplicated"] += len(chunks) - len(new_chunks)
+        if not new_chunks:
+            return 0
+        texts = [chunk for chunk, _ in new_chunks.values()]
+        vectors = await embed_documents_cached(embedding_model, texts, stats)
+        vector_store = await asyncio.to_thread(
+            append_embeddings, vector_store, texts, vectors,
+            [metadata for _, metadata in new_chunks.values()], list(new_chunks), embedding_model
+        )
+        await asyncio.to_thread(save_vector_store, vector_store, session_id)
+    return len(new_chunks)
+
+def session_index_dir(session_id):
+    return f"faiss_index/{session_id}"
+
+def current_index_dir(session_id):
+    """
+    Directory holding the session's current index, or None if it has none.
+    Each save writes a new version directory and then switches the CURRENT pointer file to it.
+    Sessions saved before versioning keep their files directly in the session directory.
+    """
+    session_dir = session_index_dir(session_id)
+    try:
+        with open(os.path.join(session_dir, "CURRENT")) as f:
+            return os.path.join(session_dir, f.read().strip())
+    except FileNotFoundError:
+        pass
+    if os.path.exists(os.path.join(session_dir, "index.faiss")):
+        return session_dir
+    return None
+
+def save_vector_store(vector_store, session_id):
+    """
+    Save the session's index atomically: write a temporary directory, rename it to a new version
+    and os.replace the CURRENT pointer, so readers see either the old or the new index, never a
+    half-written one. The previous version is kept for readers still loading it; older ones are removed.
+    The FAISS index is written with faiss.write_index and the chunks to a SQLite docstore, and
+    vector_store is switched to the new docstore so its pending documents are released.
+    """
+    session_dir = session_index_dir(session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=session_dir)
+    faiss.write_index(vector_store.index, os.path.join(tmp_dir, "index.faiss"))
+    write_docstore(tmp_dir, vector_store.docstore, vector_store.index_to_docstore_id)
+    with open(os.path.join(tmp_dir, "embedding.json"), "w") as f:
+        json.dump(embedding_signature(vector_store.embeddings, vector_store.index.d), f)
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(session_dir, version)
+    os.rename(tmp_dir, version_dir)
+    pointer_tmp = os.path.join(session_dir, f".CURRENT.{os.getpid()}.{threading.get_ident()}")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(session_dir, "CURRENT"))
+    get_vector_store_registry().invalidate(session_id)
+    get_answer_cache().invalidate(session_id)
+    vector_store.docstore, vector_store.index_to_docstore_id = load_docstore(version_dir)
+
+    # Readers holding a removed version keep their open (mapped) files until they close them
+    versions = sorted(name for name in os.listdir(session_dir) if name.startswith("v"))
+    for old_version in versions[:-2]:
+        shutil.rmtree(os.path.join(session_dir, old_version), ignore_errors=True)
 
 def load_vector_store(session_id):
-    embedding_model = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001", google_api_key=SecretStr(GOOGLE_API_KEY))
-    path = f"faiss_index/{session_id}"
-    if not os.path.exists(path):
+    """Return the session's index from the process-wide registry, reading it from disk on a miss."""
+    return get_vector_store_registry().get(session_id, read_vector_store)
+
+def check_embedding_signature(path, embedding_model):
+    """Refuse to load an index embedded with a different provider, model or dimension."""
+    try:
+        with open(os.path.join(path, "embedding.json")) as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return  # saved before signatures were recorded
+    current = embedding_signature(embedding_model)
+    mismatch = (stored["provider"], stored["model"]) != (current["provider"], current["model"])
+    # API models do not report their dimension up front; the local one does
+    if current["dim"] is not None and current["dim"] != stored["dim"]:
+        mismatch = True
+    if mismatch:
+        raise Exception(
+            f"Vector store at {path} was built with {stored['provider']} embeddings ({stored['model']}, "
+            f"dim {stored['dim']}) but {current['provider']} embeddings ({current['model']}) are configured. "
+            f"Re-upload the documents or change EMBEDDING_PROVIDER."
+        )
+
+def read_vector_store(session_id, mmap=FAISS_INDEX_MMAP):
+    """
+    Read the session's current index from disk.
+    With mmap the FAISS index is memory-mapped read-only, so pages are loaded as searches touch
+    them; chunk texts and metadata stay in SQLite and only search hits are fetched. Indexes saved
+    before the SQLite docstore fall back to LangChain's pickle format (converted on the next save).
+    """
+    embedding_model = get_embedding_model()
+    path = current_index_dir(session_id)
+    if path is None:
         raise Exception(f"No vector store found for session: {session_id}")
-    return FAISS.load_local(path, embedding_model, allow_dangerous_deserialization=True) 
\ No newline at end of file
+    check_embedding_signature(path, embedding_model)
+    if os.path.exists(os.path.join(path, DOCSTORE_FILE)):
+        io_flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(os.path.join(path, "index.faiss"), io_flags)
+        docstore, index_to_docstore_id = load_docstore(path)
+        vector_store = FAISS(embedding_model, index, docstore, index_to_docstore_id)
+    else:
+        vector_store = FAISS.load_local(path, embedding_model, allow_dangerous_deserialization=True)
+    tune_index(vector_store.index)
+    # Cached chat answers are keyed on the version they were retrieved from
+    vector_store.index_version = os.path.basename(path)
+    return vector_store
+
+def read_vector_store_if_exists(session_id):
+    """The session's index loaded for extending (not memory-mapped), or None if it has none."""
+    return read_vector_store(session_id, mmap=False) if current_index_dir(session_id) is not None else None